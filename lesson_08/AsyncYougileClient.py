@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+
+from YougileClient import (RETRY_METHODS, RETRY_STATUSES, YougileClient,
+                           retry_after)
+
+
+class AsyncYougileClient:
+    """Асинхронный клиент Yougile API v2 на httpx.AsyncClient
+
+    Те же методы, что у YougileClient, но корутины. Число одновременных
+    запросов ограничено семафором (concurrency), соединения
+    переиспользуются из пула httpx. GET/PUT с ответами 429/5xx
+    повторяются с паузой backoff_factor * 2 ** n или Retry-After.
+    rate_limiter (RateLimiter) ограничивает темп запросов.
+    gather_projects/create_projects выполняют пачку запросов
+    конкурентно и возвращают ответы в порядке аргументов.
+    """
+
+    BASE_URL = YougileClient.BASE_URL
+
+    def __init__(self, api_key="", base_url=None, concurrency: int = 10,
+                 retries: int = 3, backoff_factor: float = 0.5,
+                 timeout: float = 30, rate_limiter=None):
+        if concurrency < 1:
+            raise ValueError("concurrency должен быть не меньше 1")
+        self.base_url = base_url or self.BASE_URL
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter
+        # h11 не пропускает заголовок с пробелом в конце ("Bearer ")
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}".strip()
+        }
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency,
+                                max_keepalive_connections=concurrency)
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs):
+        url = f"{self.base_url}{path}"
+        limiter = self.rate_limiter
+        attempt = 0
+        while True:
+            if limiter is not None:
+                await limiter.acquire_async()
+            async with self._semaphore:
+                resp = await self._client.request(method, url, **kwargs)
+            if limiter is not None:
+                limiter.on_response(resp.status_code, resp.headers)
+            # С лимитером 429 повторяется для любого метода (запрос не
+            # принят), а паузу по Retry-After выдерживает сам лимитер
+            limited = limiter is not None and resp.status_code == 429
+            retryable = limited or (resp.status_code in RETRY_STATUSES
+                                    and method in RETRY_METHODS)
+            if not retryable or attempt >= self.retries:
+                return resp
+            # Пауза перед повтором не занимает слот семафора
+            delay = 0 if limited else retry_after(resp)
+            if delay is None:
+                delay = self.backoff_factor * 2 ** attempt
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def create_project(self, title):
+        return await self._request("POST", "/projects",
+                                   json={"title": title})
+
+    async def get_project(self, project_id):
+        return await self._request("GET", f"/projects/{project_id}")
+
+    async def update_project(self, project_id, title):
+        return await self._request("PUT", f"/projects/{project_id}",
+                                   json={"title": title})
+
+    async def gather_projects(self, project_ids):
+        """Ответы get_project для всех project_ids"""
+        return await asyncio.gather(
+            *(self.get_project(project_id) for project_id in project_ids))
+
+    async def create_projects(self, titles):
+        """Ответы create_project для всех titles"""
+        return await asyncio.gather(
+            *(self.create_project(title) for title in titles))
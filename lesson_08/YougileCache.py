@@ -0,0 +1,207 @@
+import hashlib
+import shelve
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Заголовки, которые хранятся вместе с телом ответа
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control")
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict
+    expires: float
+
+
+def _cache_control(headers):
+    value = headers.get("Cache-Control") or ""
+    return [directive.strip().lower() for directive in value.split(",")]
+
+
+def _max_age(directives):
+    """Срок жизни из Cache-Control: 0 для no-cache, None если не задан"""
+    if "no-cache" in directives:
+        return 0.0
+    for directive in directives:
+        if directive.startswith("max-age="):
+            try:
+                return max(0.0, float(directive[len("max-age="):]))
+            except ValueError:
+                return None
+    return None
+
+
+def _credentials(authorization: str):
+    """Хэш заголовка Authorization: токен не хранится в кэше и на диске"""
+    return hashlib.sha256((authorization or "").encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Кэш ответов GET по URL: LRU в памяти и необязательно на диске
+
+    Свежие записи (моложе ttl или max-age из Cache-Control) отдаются без
+    запроса. Устаревшие перепроверяются условным запросом
+    (If-None-Match/If-Modified-Since): на 304 тело берётся из кэша.
+    Для каждого URL ответы хранятся отдельно по хэшу Authorization,
+    поэтому кэш можно делить между клиентами с разными ключами API;
+    invalidate(url) сбрасывает ответы для всех ключей.
+    С path записи дублируются в файл shelve и переживают перезапуск;
+    max_entries ограничивает и память, и файл.
+    stats() - доля попаданий и сэкономленные байты.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0,
+                 path: str = None, clock=time.time):
+        if max_entries < 1:
+            raise ValueError("max_entries должен быть не меньше 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # url -> {хэш Authorization: CachedResponse}
+        self._entries = OrderedDict()
+        self._disk = shelve.open(path) if path else None
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def close(self):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _variants(self, url: str):
+        variants = self._entries.get(url)
+        if variants is None and self._disk is not None:
+            variants = self._disk.get(url)
+            if variants is not None:
+                self._remember(url, variants)
+        elif variants is not None:
+            self._entries.move_to_end(url)
+        return variants or {}
+
+    def _remember(self, url: str, variants):
+        self._entries[url] = variants
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, url: str, variants):
+        if not variants:
+            self._entries.pop(url, None)
+            if self._disk is not None:
+                self._disk.pop(url, None)
+            return
+        self._remember(url, variants)
+        if self._disk is not None:
+            self._disk[url] = variants
+            if len(self._disk) > self.max_entries:
+                self._prune_disk()
+
+    def _prune_disk(self):
+        """Удаление из файла устаревших, затем самых старых записей
+
+        Чистим с запасом (до 90% max_entries), чтобы не перебирать файл
+        при каждой следующей записи.
+        """
+        now = self._clock()
+        expires = {}
+        for url in list(self._disk.keys()):
+            latest = max(entry.expires for entry in self._disk[url].values())
+            if latest <= now:
+                del self._disk[url]
+            else:
+                expires[url] = latest
+        keep = max(1, self.max_entries * 9 // 10)
+        for url in sorted(expires, key=expires.get)[:-keep]:
+            del self._disk[url]
+
+    def _put(self, url: str, credentials: str, body: bytes, headers):
+        ttl = _max_age(_cache_control(headers))
+        entry = CachedResponse(
+            body,
+            {name: headers[name] for name in KEPT_HEADERS
+             if headers.get(name) is not None},
+            self._clock() + (self.ttl if ttl is None else ttl))
+        variants = dict(self._variants(url))
+        variants[credentials] = entry
+        self._save(url, variants)
+        return entry
+
+    def lookup(self, url: str, authorization: str = ""):
+        """(запись или None, свежая ли она); свежая запись - попадание"""
+        with self._lock:
+            entry = self._variants(url).get(_credentials(authorization))
+            fresh = entry is not None and entry.expires > self._clock()
+            if fresh:
+                self.hits += 1
+                self.bytes_saved += len(entry.body)
+            return entry, fresh
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Заголовки условного запроса для перепроверки записи"""
+        if entry is None:
+            return {}
+        headers = {}
+        if "ETag" in entry.headers:
+            headers["If-None-Match"] = entry.headers["ETag"]
+        if "Last-Modified" in entry.headers:
+            headers["If-Modified-Since"] = entry.headers["Last-Modified"]
+        return headers
+
+    def revalidated(self, url: str, entry, headers, authorization: str = ""):
+        """Ответ 304: запись продлевается, новые заголовки сохраняются"""
+        with self._lock:
+            self.revalidations += 1
+            self.bytes_saved += len(entry.body)
+            merged = dict(entry.headers)
+            merged.update({name: headers[name] for name in KEPT_HEADERS
+                           if headers.get(name) is not None})
+            return self._put(url, _credentials(authorization), entry.body,
+                             merged)
+
+    def store(self, url: str, status_code: int, body: bytes, headers,
+              authorization: str = ""):
+        """Полный ответ сервера: 200 кэшируется, 404/410 удаляют запись"""
+        credentials = _credentials(authorization)
+        with self._lock:
+            self.misses += 1
+            if status_code == 200 \
+                    and "no-store" not in _cache_control(headers):
+                self._put(url, credentials, body, headers)
+            elif status_code in (200, 404, 410):
+                variants = dict(self._variants(url))
+                variants.pop(credentials, None)
+                self._save(url, variants)
+
+    def invalidate(self, url: str):
+        """Сброс ответов по url для всех ключей API"""
+        with self._lock:
+            self._save(url, {})
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.revalidations + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "revalidations": self.revalidations,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.revalidations) / requests
+                if requests else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
@@ -0,0 +1,219 @@
+import codecs
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from YougileStream import iter_json_array
+
+# Размер фрагмента, которыми читается тело страницы проектов
+PAGE_CHUNK_SIZE = 16 * 1024
+
+# Ответы, после которых запрос повторяется с экспоненциальной паузой
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Методы, которые безопасно повторять после ответа 5xx
+RETRY_METHODS = ("GET", "PUT")
+
+
+def retry_after(resp):
+    """Пауза из заголовка Retry-After в секундах или None"""
+    value = resp.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class YougileClient:
+    """Клиент Yougile API v2 поверх requests.Session
+
+    Соединения берутся из пула HTTPAdapter и переиспользуются
+    (keep-alive), запросы с ответами 429/5xx повторяются с паузой
+    backoff_factor * 2 ** n, заголовок Retry-After учитывается.
+    Закрывайте клиент через close() или используйте как контекстный
+    менеджер. С rate_limiter (RateLimiter) повторы по статусу
+    выполняет сам клиент, как AsyncYougileClient: каждая попытка берёт
+    токен, и лимитер видит каждый ответ.
+    С cache (ResponseCache) get_project отдаёт свежие ответы из кэша и
+    перепроверяет устаревшие условным запросом; update_project
+    сбрасывает запись проекта.
+    """
+
+    BASE_URL = "https://ru.yougile.com/api-v2"
+
+    def __init__(self, api_key="", base_url=None, pool_size: int = 10,
+                 retries: int = 3, backoff_factor: float = 0.5,
+                 timeout: float = 30, rate_limiter=None, cache=None):
+        self.base_url = base_url or self.BASE_URL
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            # С лимитером urllib3 повторяет только ошибки соединения:
+            # без ответа нет и Retry-After, а запрос мимо лимитера не уйдёт
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUSES if rate_limiter is None
+                else (),
+                respect_retry_after_header=rate_limiter is None,
+                raise_on_status=False
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _request(self, method: str, path: str, **kwargs):
+        url = f"{self.base_url}{path}"
+        limiter = self.rate_limiter
+        if limiter is None:
+            return self.session.request(method, url, timeout=self.timeout,
+                                        **kwargs)
+
+        for attempt in range(self.retries + 1):
+            limiter.acquire()
+            resp = self.session.request(method, url, timeout=self.timeout,
+                                        **kwargs)
+            limiter.on_response(resp.status_code, resp.headers)
+            # 429 - запрос не принят, повтор безопасен для любого метода;
+            # паузу по Retry-After выдерживает лимитер
+            limited = resp.status_code == 429
+            retryable = limited or (resp.status_code in RETRY_STATUSES
+                                    and method in RETRY_METHODS)
+            if not retryable or attempt == self.retries:
+                break
+            # Ответ со stream=True держит соединение пула, пока тело не
+            # дочитано: дочитываем короткое тело ошибки и возвращаем его
+            resp.content
+            resp.close()
+            delay = 0 if limited else retry_after(resp)
+            if delay is None:
+                delay = self.backoff_factor * 2 ** attempt
+            time.sleep(delay)
+        return resp
+
+    @staticmethod
+    def _cached_response(url: str, entry):
+        """requests.Response с телом и заголовками из кэша"""
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(entry.headers)
+        resp._content = entry.body
+        return resp
+
+    def _cached_get(self, path: str):
+        url = f"{self.base_url}{path}"
+        # Ответы в общем кэше разделены по ключу API
+        authorization = self.headers["Authorization"]
+        entry, fresh = self.cache.lookup(url, authorization)
+        if fresh:
+            return self._cached_response(url, entry)
+
+        resp = self._request("GET", path,
+                             headers=self.cache.conditional_headers(entry))
+        if resp.status_code == 304 and entry is not None:
+            entry = self.cache.revalidated(url, entry, resp.headers,
+                                           authorization)
+            return self._cached_response(url, entry)
+        self.cache.store(url, resp.status_code, resp.content, resp.headers,
+                         authorization)
+        return resp
+
+    def create_project(self, title):
+        return self._request("POST", "/projects", json={"title": title})
+
+    def get_project(self, project_id):
+        path = f"/projects/{project_id}"
+        if self.cache is None:
+            return self._request("GET", path)
+        return self._cached_get(path)
+
+    def update_project(self, project_id, title):
+        path = f"/projects/{project_id}"
+        resp = self._request("PUT", path, json={"title": title})
+        if self.cache is not None:
+            self.cache.invalidate(f"{self.base_url}{path}")
+        return resp
+
+    def _projects_page(self, offset: int, limit: int):
+        """Страница GET /projects; тело не читается (stream=True)"""
+        return self._request("GET", "/projects", stream=True,
+                             params={"limit": limit, "offset": offset})
+
+    def iter_projects(self, limit: int = 100, prefetch: bool = True):
+        """Все проекты по одному, страницами по limit (limit/offset)
+
+        JSON страницы разбирается по мере чтения из сокета, поэтому в
+        памяти не больше одной страницы. С prefetch запрос следующей
+        страницы уходит в фоновом потоке, как только из paging ответа
+        известно, что она есть. Ошибка HTTP - requests.HTTPError.
+        """
+        if limit < 1:
+            raise ValueError("limit должен быть не меньше 1")
+        pool = ThreadPoolExecutor(max_workers=1,
+                                  thread_name_prefix="yougile-page") \
+            if prefetch else None
+        offset = 0
+        resp = self._projects_page(offset, limit)
+        pending = None
+        try:
+            while True:
+                resp.raise_for_status()
+                has_next = None
+
+                def on_field(key, value):
+                    nonlocal has_next, pending
+                    if key != "paging" or "next" not in value:
+                        return
+                    has_next = bool(value["next"])
+                    if has_next and pool is not None:
+                        pending = pool.submit(self._projects_page,
+                                              offset + limit, limit)
+
+                decoder = codecs.getincrementaldecoder(
+                    resp.encoding or "utf-8")()
+                chunks = (decoder.decode(chunk) for chunk
+                          in resp.iter_content(PAGE_CHUNK_SIZE))
+                count = 0
+                for project in iter_json_array(chunks, "content", on_field):
+                    count += 1
+                    yield project
+                resp.close()
+
+                # Без paging.next страница неполная - значит последняя
+                if not (count == limit if has_next is None else has_next):
+                    return
+                offset += limit
+                if pending is not None:
+                    resp, pending = pending.result(), None
+                else:
+                    resp = self._projects_page(offset, limit)
+        finally:
+            resp.close()
+            if pending is not None and pending.exception() is None:
+                pending.result().close()
+            if pool is not None:
+                pool.shutdown(wait=True)
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+
+def _header(headers, name: str):
+    """Числовое значение заголовка или None"""
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket для запросов к Yougile API, общий для клиентов
+
+    Токены пополняются со скоростью rate в секунду, в ведре не больше
+    burst токенов. Скорость подстраивается по ответам сервера (AIMD):
+    429 умножает rate на decrease, успешный ответ прибавляет increase
+    (не выше max_rate). Retry-After и X-RateLimit-Remaining = 0 вместе с
+    X-RateLimit-Reset останавливают выдачу токенов до указанного момента;
+    накопившаяся за это время очередь затем идёт с интервалом 1 / rate.
+    Один экземпляр можно передать и YougileClient, и AsyncYougileClient.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = None,
+                 min_rate: float = 0.1, max_rate: float = None,
+                 increase: float = 0.1, decrease: float = 0.5,
+                 clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate должен быть больше 0")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease должен быть в интервале (0, 1)")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.decrease = decrease
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        # Момент, к которому относится _tokens; в будущем при блокировке
+        self._updated = self._started = clock()
+        self.acquired = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        # Во время блокировки _updated в будущем: токены не копятся
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        """Забирает токен; сколько секунд подождать перед запросом"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            # Токен берётся в долг: ожидающие встают в очередь и после
+            # блокировки идут по одному через 1 / rate
+            self._tokens -= 1
+            wait = max(0.0, self._updated - now) + \
+                max(0.0, -self._tokens / self.rate)
+            self.acquired += 1
+            if wait > 0:
+                self.throttled += 1
+                self.throttled_seconds += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_response(self, status_code: int, headers):
+        """Подстраивает скорость по коду ответа и заголовкам лимитов"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            block = None
+            if status_code == 429:
+                self.rate_limited += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._tokens = min(self._tokens, 0.0)
+                block = _header(headers, "Retry-After")
+            elif status_code < 500:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+            remaining = _header(headers, "X-RateLimit-Remaining")
+            reset = _header(headers, "X-RateLimit-Reset")
+            if remaining is not None and reset is not None:
+                # Reset бывает и числом секунд, и unix-временем
+                if reset > 1e9:
+                    reset = max(0.0, reset - time.time())
+                if remaining < 1:
+                    block = max(block or 0.0, reset)
+                elif reset > 0:
+                    self.rate = max(self.min_rate,
+                                    min(self.rate, remaining / reset))
+
+            if block is not None:
+                # Пополнение начнётся только после блокировки
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = max(self._updated, now + block)
+
+    def stats(self):
+        with self._lock:
+            elapsed = self._clock() - self._started
+            return {
+                "rate": self.rate,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "throttled_seconds": self.throttled_seconds,
+                "rate_limited": self.rate_limited,
+                "effective_rate": self.acquired / elapsed if elapsed else 0.0,
+            }
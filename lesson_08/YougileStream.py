@@ -0,0 +1,92 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+
+
+class _StreamReader:
+    """Разбор JSON по частям из потока фрагментов текста (raw_decode)"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+        else:
+            # Разобранная часть буфера отбрасывается
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+
+    def peek(self):
+        """Следующий значащий символ (без пробелов)"""
+        while True:
+            while self._pos < len(self._buffer) \
+                    and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise ValueError("Ответ оборвался посреди JSON")
+            self._read_more()
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Ожидался символ {char!r} в JSON")
+        self._pos += 1
+
+    def value(self):
+        """Очередное JSON-значение целиком"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer,
+                                                      self._pos)
+                # Число в конце буфера может продолжиться в следующем
+                # фрагменте: принимаем его только если после него что-то есть
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read_more()
+
+
+def iter_json_array(chunks, array_key: str, on_field=None):
+    """Элементы массива array_key из JSON-объекта, по одному
+
+    chunks - фрагменты текста ответа. Объект целиком в памяти не
+    собирается: в буфере только ещё не разобранный хвост. Остальные поля
+    объекта передаются в on_field(key, value) по мере разбора, поэтому
+    поле, идущее до массива (например, paging), известно раньше,
+    чем его элементы.
+    """
+    reader = _StreamReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == array_key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value()
+                    if reader.peek() != ",":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            value = reader.value()
+            if on_field is not None:
+                on_field(key, value)
+        if reader.peek() != ",":
+            break
+        reader.expect(",")
+    reader.expect("}")
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+PROJECT_PATH = re.compile(r"^/api-v2/projects/([^/?]+)$")
+
+
+def _response_bytes(status: int, body, headers):
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+             "Content-Type: application/json",
+             f"Content-Length: {len(data)}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 - соединения держатся открытыми (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело пишутся раздельно: без TCP_NODELAY keep-alive
+    # упирается в задержку ACK (~40 мс на запрос)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.stub.count_connection()
+
+    def _send(self, status: int, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _handle(self, method: str):
+        stub = self.server.stub
+        failure = stub.begin()
+        try:
+            body = self._read_json() if method in ("POST", "PUT") else None
+            if stub.delay:
+                time.sleep(stub.delay)
+            self._send(*stub.respond(failure, method, self.path, body,
+                                     self.headers))
+        finally:
+            stub.finish()
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+class _ProjectStore:
+    """Общее состояние заглушек: проекты, счётчики, инъекция ошибок"""
+
+    def __init__(self, delay: float = 0):
+        self.projects = {}
+        self.modified = {}
+        # etags=False - только Last-Modified; max_age - Cache-Control
+        self.etags = True
+        self.max_age = None
+        self.not_modified = 0
+        self.requests = 0
+        self.connections = 0
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failures = []
+        self._lock = threading.Lock()
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def fail_next(self, status: int, count: int = 1, headers=None):
+        """Следующие count запросов получат status с заголовками headers"""
+        with self._lock:
+            self._failures.extend([(status, headers or {})] * count)
+
+    def begin(self):
+        """Учёт начала запроса; ошибка из fail_next() или None"""
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self._failures.pop(0) if self._failures else None
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def respond(self, failure, method: str, path: str, body, headers=None):
+        """(status, body, headers) ответа на запрос"""
+        if failure is not None:
+            status, headers = failure
+            return status, {"error": "stub failure"}, headers
+        return self.dispatch(method, path, body, headers or {})
+
+    def _conditional_get(self, project, request_headers):
+        """GET проекта с ETag/Last-Modified и ответом 304"""
+        modified = self.modified[project["id"]]
+        headers = {"Last-Modified": formatdate(modified, usegmt=True)}
+        if self.max_age is not None:
+            headers["Cache-Control"] = f"max-age={self.max_age}"
+        if self.etags:
+            digest = hashlib.md5(
+                json.dumps(project, sort_keys=True).encode("utf-8"))
+            headers["ETag"] = f'"{digest.hexdigest()}"'
+
+        # If-None-Match важнее If-Modified-Since (RFC 9110)
+        if_none_match = request_headers.get("if-none-match")
+        since = request_headers.get("if-modified-since")
+        if "ETag" in headers and if_none_match is not None:
+            not_modified = if_none_match == headers["ETag"]
+        elif since is not None:
+            not_modified = \
+                parsedate_to_datetime(since).timestamp() >= int(modified)
+        else:
+            not_modified = False
+        if not_modified:
+            self.not_modified += 1
+            return 304, None, headers
+        return 200, dict(project), headers
+
+    def _list_projects(self, query: str):
+        """Страница проектов в формате Yougile: paging + content"""
+        params = parse_qs(query)
+        try:
+            limit = int(params.get("limit", ["50"])[0])
+            offset = int(params.get("offset", ["0"])[0])
+        except ValueError:
+            return 400, {"error": "limit/offset must be integers"}, {}
+        if not 1 <= limit <= 1000 or offset < 0:
+            return 400, {"error": "limit/offset out of range"}, {}
+        projects = list(self.projects.values())
+        return 200, {
+            "paging": {"count": len(projects), "limit": limit,
+                       "offset": offset,
+                       "next": offset + limit < len(projects)},
+            "content": projects[offset:offset + limit],
+        }, {}
+
+    def dispatch(self, method: str, path: str, body, headers=None):
+        """(status, body, headers) для запроса к API"""
+        path, _, query = path.partition("?")
+        with self._lock:
+            if method == "GET" and path == "/api-v2/projects":
+                return self._list_projects(query)
+            if method == "POST" and path == "/api-v2/projects":
+                title = (body or {}).get("title")
+                if not title:
+                    return 400, {"error": "title is required"}, {}
+                project_id = str(uuid.uuid4())
+                self.projects[project_id] = {"id": project_id,
+                                             "title": title}
+                self.modified[project_id] = time.time()
+                return 201, {"id": project_id}, {}
+
+            match = PROJECT_PATH.match(path)
+            if match is None:
+                return 404, {"error": "not found"}, {}
+            project = self.projects.get(match.group(1))
+            if project is None:
+                return 404, {"error": "project not found"}, {}
+
+            if method == "GET":
+                return self._conditional_get(project, headers or {})
+            if method == "PUT":
+                project.update({key: value
+                                for key, value in (body or {}).items()
+                                if key in ("title", "deleted", "users")})
+                self.modified[project["id"]] = time.time()
+                return 200, {"id": project["id"]}, {}
+            return 405, {"error": "method not allowed"}, {}
+
+
+class YougileStub(_ProjectStore):
+    """Локальная заглушка ru.yougile.com/api-v2 для тестов и бенчмарков
+
+    Хранит проекты в памяти, поддерживает GET /projects?limit=&offset=,
+    POST /projects, GET/PUT /projects/{id} (GET с ETag/Last-Modified
+    и 304). Считает запросы и TCP-соединения; fail_next() заставляет
+    следующие запросы вернуть ошибку.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 delay: float = 0):
+        super().__init__(delay)
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api-v2"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class AsyncYougileStub(_ProjectStore):
+    """Та же заглушка API на asyncio.start_server
+
+    Работает в цикле событий теста, поэтому подходит для
+    AsyncYougileClient; delay задерживает каждый ответ (asyncio.sleep),
+    а max_in_flight показывает наибольшее число одновременных запросов.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 delay: float = 0):
+        super().__init__(delay)
+        self._address = (host, port)
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/api-v2"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve,
+                                                  *self._address)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _serve(self, reader, writer):
+        self.count_connection()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ")
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                data = await reader.readexactly(length) if length else b""
+
+                failure = self.begin()
+                try:
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    response = self.respond(failure, method, path,
+                                            json.loads(data or b"{}"),
+                                            headers)
+                finally:
+                    self.finish()
+                writer.write(_response_bytes(*response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,65 @@
+"""Запросов в секунду к YougileClient с переиспользованием соединений и без
+
+Запросы идут в локальную заглушку API (YougileStub): без reuse каждый
+вызов requests.get открывает новое TCP-соединение, с reuse клиент берёт
+соединения из пула сессии.
+
+Пример запуска:
+    python bench_YougileClient.py --requests 2000 --clients 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from YougileClient import YougileClient
+from YougileStub import YougileStub
+
+
+def run(call, total: int, clients: int):
+    """total вызовов в clients потоках, (запросов в секунду, секунд)"""
+    def worker(_):
+        for _ in range(total // clients):
+            assert call().status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(clients)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="число запросов GET /projects/{id}")
+    parser.add_argument("--clients", type=int, default=1,
+                        help="число параллельных клиентов (потоков)")
+    args = parser.parse_args()
+
+    with YougileStub() as stub:
+        with YougileClient(base_url=stub.base_url,
+                           pool_size=args.clients) as client:
+            project_id = client.create_project("Бенчмарк").json()["id"]
+            url = f"{stub.base_url}/projects/{project_id}"
+
+            results = {}
+            before = stub.connections
+            results["без reuse"] = run(
+                lambda: requests.get(url, headers=client.headers),
+                args.requests, args.clients) + (stub.connections - before,)
+            before = stub.connections
+            results["сессия"] = run(
+                lambda: client.get_project(project_id),
+                args.requests, args.clients) + (stub.connections - before,)
+
+    print(f"{'вариант':12} {'запр/с':>10} {'секунд':>9} {'соединений':>11}")
+    for name, (rps, elapsed, connections) in results.items():
+        print(f"{name:12} {rps:10.1f} {elapsed:9.3f} {connections:11}")
+    speedup = results["сессия"][0] / results["без reuse"][0]
+    print(f"\nУскорение: x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
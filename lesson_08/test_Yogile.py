@@ -1,37 +1,22 @@
-import requests
-
-
-class YougileClient:
-    BASE_URL = "https://ru.yougile.com/api-v2"
+import asyncio
+import shelve
+import time
 
-    def __init__(self, api_key=""):
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
+import pytest
+import requests
 
-    def create_project(self, title):
-        resp = requests.post(
-            f"{self.BASE_URL}/projects",
-            json={"title": title},
-            headers=self.headers
-        )
-        return resp
+from AsyncYougileClient import AsyncYougileClient
+from YougileCache import ResponseCache
+from YougileClient import YougileClient
+from YougileRateLimiter import RateLimiter
+from YougileStream import iter_json_array
+from YougileStub import AsyncYougileStub, YougileStub
 
-    def get_project(self, project_id):
-        resp = requests.get(
-            f"{self.BASE_URL}/projects/{project_id}",
-            headers=self.headers
-        )
-        return resp
 
-    def update_project(self, project_id, title):
-        resp = requests.put(
-            f"{self.BASE_URL}/projects/{project_id}",
-            json={"title": title},
-            headers=self.headers
-        )
-        return resp
+@pytest.fixture
+def stub():
+    with YougileStub() as server:
+        yield server
 
 
 # ПОЗИТИВНЫЕ ТЕСТЫ
@@ -96,6 +81,455 @@ def test_update_project_negative():
     assert resp.status_code == 404, f"Status code: {resp.status_code}"
 
 
+# Тесты клиента на локальной заглушке API
+def test_stub_crud(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        create_resp = client.create_project("Проект в заглушке")
+        assert create_resp.status_code == 201
+        project_id = create_resp.json()["id"]
+
+        assert client.update_project(project_id, "Новое").status_code == 200
+        resp = client.get_project(project_id)
+        assert resp.json() == {"id": project_id, "title": "Новое"}
+
+        assert client.create_project("").status_code == 400
+        assert client.get_project("non-existent-123").status_code == 404
+
+
+def test_stub_connection_reuse(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        project_id = client.create_project("Keep-alive").json()["id"]
+        for _ in range(20):
+            assert client.get_project(project_id).status_code == 200
+
+    assert stub.requests == 21
+    assert stub.connections == 1
+
+
+def test_stub_retry_after(stub):
+    with YougileClient(base_url=stub.base_url, backoff_factor=0) as client:
+        project_id = client.create_project("Повторы").json()["id"]
+        stub.fail_next(429, headers={"Retry-After": "0"})
+        stub.fail_next(503)
+
+        resp = client.get_project(project_id)
+
+    assert resp.status_code == 200
+    assert stub.requests == 4
+
+
+def test_stub_retries_exhausted(stub):
+    with YougileClient(base_url=stub.base_url, retries=2,
+                       backoff_factor=0) as client:
+        stub.fail_next(503, count=5)
+        resp = client.get_project("any")
+
+    assert resp.status_code == 503
+    assert stub.requests == 3
+
+
+# Тесты асинхронного клиента на asyncio-заглушке API
+def test_async_stub_crud():
+    async def scenario():
+        async with AsyncYougileStub() as stub:
+            async with AsyncYougileClient(base_url=stub.base_url) as client:
+                create_resp = await client.create_project("Async проект")
+                assert create_resp.status_code == 201
+                project_id = create_resp.json()["id"]
+
+                resp = await client.update_project(project_id, "Новое")
+                assert resp.status_code == 200
+                resp = await client.get_project(project_id)
+                assert resp.json() == {"id": project_id, "title": "Новое"}
+
+                assert (await client.create_project("")).status_code == 400
+                resp = await client.get_project("non-existent-123")
+                assert resp.status_code == 404
+
+    asyncio.run(scenario())
+
+
+def test_async_bulk_bounded_concurrency():
+    async def scenario():
+        async with AsyncYougileStub(delay=0.01) as stub:
+            async with AsyncYougileClient(base_url=stub.base_url,
+                                          concurrency=4) as client:
+                titles = [f"Проект {i}" for i in range(30)]
+                created = await client.create_projects(titles)
+                ids = [resp.json()["id"] for resp in created]
+
+                fetched = await client.gather_projects(ids)
+
+            assert [resp.json()["title"] for resp in fetched] == titles
+            assert stub.requests == 60
+            assert 1 < stub.max_in_flight <= 4
+            assert stub.connections <= 4
+
+    asyncio.run(scenario())
+
+
+def test_async_retry_after():
+    async def scenario():
+        async with AsyncYougileStub() as stub:
+            async with AsyncYougileClient(base_url=stub.base_url,
+                                          backoff_factor=0) as client:
+                project_id = (await client.create_project("Повторы")) \
+                    .json()["id"]
+                stub.fail_next(429, headers={"Retry-After": "0"})
+                stub.fail_next(503)
+                resp = await client.get_project(project_id)
+                assert resp.status_code == 200
+                assert stub.requests == 4
+
+                # POST не повторяется: проект мог быть уже создан
+                stub.fail_next(503)
+                resp = await client.create_project("Без повтора")
+                assert resp.status_code == 503
+                assert stub.requests == 5
+
+    asyncio.run(scenario())
+
+
+def test_async_concurrency_validation():
+    with pytest.raises(ValueError):
+        AsyncYougileClient(concurrency=0)
+
+
+# Тесты лимитера запросов (token bucket)
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_limiter_token_bucket():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=2, clock=clock)
+
+    assert [limiter.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now += 1
+    assert limiter.reserve() == 0.5
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 5
+    assert stats["throttled"] == 3
+    assert stats["throttled_seconds"] == pytest.approx(2.0)
+    assert stats["effective_rate"] == pytest.approx(5.0)
+
+
+def test_rate_limiter_adapts_to_429():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, max_rate=12, increase=1, clock=clock)
+
+    limiter.on_response(429, {"Retry-After": "3"})
+    assert limiter.rate == 5
+    assert limiter.reserve() == pytest.approx(3.2)
+    assert limiter.stats()["rate_limited"] == 1
+
+    for _ in range(10):
+        limiter.on_response(200, {})
+    assert limiter.rate == 12
+
+
+def test_rate_limiter_headers():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, clock=clock)
+
+    limiter.on_response(200, {"X-RateLimit-Remaining": "4",
+                              "X-RateLimit-Reset": "2"})
+    assert limiter.rate == 2
+
+    limiter.on_response(200, {"X-RateLimit-Remaining": "0",
+                              "X-RateLimit-Reset": "7"})
+    assert limiter.reserve() == pytest.approx(7 + 1 / limiter.rate)
+
+
+def test_rate_limiter_queue_after_block():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, clock=clock)
+
+    limiter.on_response(429, {"Retry-After": "3"})
+    waits = [limiter.reserve() for _ in range(10)]
+    assert waits == pytest.approx([3 + 0.2 * i for i in range(1, 11)])
+
+    # После блокировки токены копятся заново с новой скоростью
+    clock.now += 10
+    assert limiter.reserve() == 0
+
+
+def test_rate_limiter_validation():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        RateLimiter(decrease=1)
+
+
+def test_rate_limiter_sees_retried_get(stub):
+    limiter = RateLimiter(rate=1000)
+    with YougileClient(base_url=stub.base_url,
+                       rate_limiter=limiter) as client:
+        project_id = client.create_project("GET 429").json()["id"]
+        stub.fail_next(429, count=2, headers={"Retry-After": "0"})
+
+        assert client.get_project(project_id).status_code == 200
+
+    assert limiter.stats()["rate_limited"] == 2
+    assert limiter.stats()["acquired"] == 4
+
+
+def test_rate_limiter_token_per_request(stub):
+    limiter = RateLimiter(rate=1000)
+    with YougileClient(base_url=stub.base_url, backoff_factor=0,
+                       rate_limiter=limiter) as client:
+        project_id = client.create_project("5xx").json()["id"]
+        stub.fail_next(503, count=2)
+        assert client.get_project(project_id).status_code == 200
+
+        stub.fail_next(503)
+        assert client.create_project("POST 503").status_code == 503
+
+    # Повторы 5xx идут через лимитер, а не внутри urllib3
+    assert stub.requests == 5
+    assert limiter.stats()["acquired"] == stub.requests
+
+
+def test_rate_limiter_shared_by_clients(stub):
+    limiter = RateLimiter(rate=1000)
+    with YougileClient(base_url=stub.base_url, backoff_factor=0,
+                       rate_limiter=limiter) as client:
+        stub.fail_next(429, headers={"Retry-After": "0"})
+        create_resp = client.create_project("Лимит")
+        assert create_resp.status_code == 201
+        project_id = create_resp.json()["id"]
+
+    async def scenario():
+        async with AsyncYougileStub() as async_stub:
+            async with AsyncYougileClient(base_url=async_stub.base_url,
+                                          rate_limiter=limiter) as client:
+                async_stub.fail_next(429, headers={"Retry-After": "0"})
+                resp = await client.create_project("Async лимит")
+                assert resp.status_code == 201
+
+    asyncio.run(scenario())
+
+    assert stub.requests == 2
+    stats = limiter.stats()
+    assert stats["acquired"] == 4
+    assert stats["rate_limited"] == 2
+    assert stats["rate"] < 1000
+    assert project_id in stub.projects
+
+
+# Тесты кэша ответов get_project
+def test_cache_fresh_hits(stub):
+    cache = ResponseCache(ttl=60)
+    with YougileClient(base_url=stub.base_url, cache=cache) as client:
+        project_id = client.create_project("Кэш").json()["id"]
+        responses = [client.get_project(project_id) for _ in range(3)]
+
+    assert [resp.json()["title"] for resp in responses] == ["Кэш"] * 3
+    assert stub.requests == 2
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == pytest.approx(2 / 3)
+    assert stats["bytes_saved"] == 2 * len(responses[0].content)
+
+
+def test_cache_revalidates_with_etag(stub):
+    cache = ResponseCache(ttl=0)
+    with YougileClient(base_url=stub.base_url, cache=cache) as client:
+        project_id = client.create_project("ETag").json()["id"]
+        first = client.get_project(project_id)
+        second = client.get_project(project_id)
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert stub.not_modified == 1
+    assert cache.stats()["revalidations"] == 1
+
+
+def test_cache_revalidates_with_last_modified(stub):
+    stub.etags = False
+    stub.max_age = 0
+    cache = ResponseCache(ttl=60)
+    with YougileClient(base_url=stub.base_url, cache=cache) as client:
+        project_id = client.create_project("Last-Modified").json()["id"]
+        client.get_project(project_id)
+        resp = client.get_project(project_id)
+
+    assert resp.json()["title"] == "Last-Modified"
+    assert stub.not_modified == 1
+    assert cache.stats()["hits"] == 0
+
+
+def test_cache_invalidated_by_update(stub):
+    cache = ResponseCache(ttl=60)
+    with YougileClient(base_url=stub.base_url, cache=cache) as client:
+        project_id = client.create_project("До").json()["id"]
+        assert client.get_project(project_id).json()["title"] == "До"
+        client.update_project(project_id, "После")
+        assert client.get_project(project_id).json()["title"] == "После"
+
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_disk_backend(stub, tmp_path):
+    path = str(tmp_path / "projects")
+    with YougileClient(base_url=stub.base_url,
+                       cache=ResponseCache(ttl=60, path=path)) as client:
+        project_id = client.create_project("Диск").json()["id"]
+        client.get_project(project_id)
+        client.cache.close()
+
+    with ResponseCache(ttl=60, path=path) as cache:
+        with YougileClient(base_url=stub.base_url, cache=cache) as client:
+            resp = client.get_project(project_id)
+
+        assert resp.json()["title"] == "Диск"
+        assert cache.stats()["hits"] == 1
+    assert stub.requests == 2
+
+
+def test_cache_shared_between_api_keys(stub):
+    cache = ResponseCache(ttl=60)
+    first = YougileClient("key-1", base_url=stub.base_url, cache=cache)
+    second = YougileClient("key-2", base_url=stub.base_url, cache=cache)
+    with first, second:
+        project_id = first.create_project("Общий кэш").json()["id"]
+        first.get_project(project_id)
+        second.get_project(project_id)
+        assert stub.requests == 3
+        assert cache.stats()["hits"] == 0
+
+        first.get_project(project_id)
+        second.get_project(project_id)
+        assert cache.stats()["hits"] == 2
+
+        # Запись одним клиентом сбрасывает ответы для всех ключей
+        first.update_project(project_id, "Новое")
+        assert second.get_project(project_id).json()["title"] == "Новое"
+
+
+def test_cache_disk_backend_is_bounded(tmp_path):
+    path = str(tmp_path / "bounded")
+    with ResponseCache(max_entries=5, ttl=60, path=path) as cache:
+        for i in range(20):
+            cache.store(f"url{i}", 200, b"{}", {})
+
+    with shelve.open(path) as disk:
+        assert 0 < len(disk) <= 5
+        assert "url19" in disk
+        assert "url0" not in disk
+
+
+def test_cache_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    for url in ("a", "b", "c"):
+        cache.store(url, 200, url.encode(), {})
+    assert cache.lookup("a") == (None, False)
+    assert cache.lookup("c")[1]
+    assert len(cache) == 2
+
+    with pytest.raises(ValueError):
+        ResponseCache(max_entries=0)
+
+
+# Тесты постраничного чтения проектов
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_iter_json_array_chunks():
+    text = '{"content": [{"id": 1}, {"id": 22, "t": "a,]"}], ' \
+           '"paging": {"next": false, "count": 12345}}'
+    fields = {}
+    items = list(iter_json_array(iter(text), "content", fields.__setitem__))
+
+    assert items == [{"id": 1}, {"id": 22, "t": "a,]"}]
+    assert fields == {"paging": {"next": False, "count": 12345}}
+    assert list(iter_json_array(["{}"], "content")) == []
+    assert list(iter_json_array(['{"content": []}'], "content")) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(['{"content": [{"id": 1}'], "content"))
+
+
+def test_iter_projects_pages(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        titles = [f"Проект {i}" for i in range(25)]
+        for title in titles:
+            client.create_project(title)
+
+        projects = list(client.iter_projects(limit=10))
+        assert [project["title"] for project in projects] == titles
+        assert stub.requests == 25 + 3
+
+        assert list(client.iter_projects(limit=25)) == projects
+        assert stub.requests == 25 + 3 + 1
+
+
+def test_iter_projects_prefetch(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        for i in range(12):
+            client.create_project(f"Проект {i}")
+
+        projects = client.iter_projects(limit=5)
+        next(projects)
+        # Вторая страница запрошена, пока первая ещё читается
+        assert wait_for(lambda: stub.requests == 12 + 2)
+        assert len(list(projects)) == 11
+        assert stub.requests == 12 + 3
+
+        projects = client.iter_projects(limit=5, prefetch=False)
+        next(projects)
+        time.sleep(0.1)
+        assert stub.requests == 12 + 3 + 1
+        projects.close()
+
+
+def test_iter_projects_early_close(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        for i in range(6):
+            client.create_project(f"Проект {i}")
+        projects = client.iter_projects(limit=2)
+        assert next(projects)["title"] == "Проект 0"
+        projects.close()
+
+        assert wait_for(lambda: stub.requests == 6 + 2)
+        assert len(list(client.iter_projects(limit=2))) == 6
+
+
+def test_iter_projects_retry_releases_connection(stub):
+    limiter = RateLimiter(rate=1000)
+    with YougileClient(base_url=stub.base_url, pool_size=1,
+                       rate_limiter=limiter) as client:
+        for i in range(3):
+            client.create_project(f"Проект {i}")
+        stub.fail_next(429, count=2, headers={"Retry-After": "0"})
+
+        assert len(list(client.iter_projects(limit=2, prefetch=False))) == 3
+        # Повторы идут по тому же соединению: отброшенные ответы закрыты
+        assert stub.connections == 1
+
+
+def test_iter_projects_errors(stub):
+    with YougileClient(base_url=stub.base_url) as client:
+        assert list(client.iter_projects()) == []
+
+        stub.fail_next(400)
+        with pytest.raises(requests.HTTPError):
+            list(client.iter_projects())
+
+        with pytest.raises(ValueError):
+            next(client.iter_projects(limit=0))
+
+
 if __name__ == "__main__":
     print("=== Запуск позитивных тестов ===")
 
@@ -0,0 +1,192 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.sql import text
+
+from UsersTable import (USER_SCRIPTS, build_search, bulk_insert_params,
+                        bulk_insert_script, chunked)
+
+# Асинхронные драйверы для синхронных строк подключения
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def to_async_url(connection_string: str):
+    """Замена синхронного драйвера на asyncpg/aiosqlite"""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if connection_string.startswith(prefix):
+            return async_prefix + connection_string[len(prefix):]
+    return connection_string
+
+
+class AsyncUserTable:
+    """Асинхронный аналог UserTable на create_async_engine
+
+    Методы повторяют API UserTable, но являются корутинами и не блокируют
+    цикл событий. Перед использованием вызовите await table.connect().
+    """
+
+    __scripts = USER_SCRIPTS
+
+    def __init__(self, connection_string, **engine_options):
+        self.__db = create_async_engine(
+            to_async_url(connection_string),
+            pool_pre_ping=True,
+            echo=False,
+            **engine_options
+        )
+
+    @property
+    def engine(self):
+        return self.__db
+
+    async def connect(self):
+        """Проверка подключения (аналог _test_connection)"""
+        try:
+            async with self.__db.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            raise ConnectionError(
+                f"Не удалось подключиться к базе данных: {e}")
+        return self
+
+    async def close(self):
+        await self.__db.dispose()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _fetchall(self, script, params=None):
+        async with self.__db.connect() as conn:
+            result = await conn.execute(script, params or {})
+            return result.fetchall()
+
+    async def _fetchone(self, script, params=None):
+        async with self.__db.connect() as conn:
+            result = await conn.execute(script, params or {})
+            return result.fetchone()
+
+    async def _write(self, script, params=None):
+        async with self.__db.begin() as conn:
+            result = await conn.execute(script, params or {})
+            return result.rowcount
+
+    async def create(self, user_id: int, user_email: str, subject_id: int):
+        if await self.check_exists(user_id):
+            raise ValueError(f"Пользователь user_id={user_id} уже существует")
+
+        return await self._write(self.__scripts["insert"], {
+            "user_id": user_id,
+            "user_email": user_email,
+            "subject_id": subject_id
+        })
+
+    async def get(self, user_id: int):
+        """Получение пользователя по ID"""
+        return await self._fetchone(self.__scripts["select"],
+                                    {"user_id": user_id})
+
+    async def get_all(self):
+        """Получение всех пользователей"""
+        return await self._fetchall(self.__scripts["select_all"])
+
+    async def iter_all(self, yield_per: int = 1000):
+        """Асинхронный генератор всех пользователей (серверный курсор)"""
+        async with self.__db.connect() as conn:
+            result = await conn.stream(self.__scripts["select_all"])
+            async for partition in result.partitions(yield_per):
+                for row in partition:
+                    yield row
+
+    async def update(self, user_id: int, user_email: str, subject_id: int):
+        """Обновление данных пользователя"""
+        if not await self.check_exists(user_id):
+            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+
+        return await self._write(self.__scripts["update"], {
+            "user_id": user_id,
+            "user_email": user_email,
+            "subject_id": subject_id
+        })
+
+    async def delete(self, user_id: int):
+        """Удаление пользователя по ID"""
+        if not await self.check_exists(user_id):
+            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+
+        return await self._write(self.__scripts["delete"],
+                                 {"user_id": user_id})
+
+    async def delete_all(self):
+        """Удаление всех пользователей (очистка таблицы)"""
+        return await self._write(self.__scripts["delete_all"])
+
+    async def count(self):
+        """Получение количества пользователей в таблице"""
+        count_row = await self._fetchone(self.__scripts["count"])
+        return count_row[0] if count_row else 0
+
+    async def get_by_email(self, user_email: str):
+        return await self._fetchall(self.__scripts["select_by_email"],
+                                    {"user_email": user_email})
+
+    async def check_exists(self, user_id: int):
+        exists_row = await self._fetchone(self.__scripts["check_exists"],
+                                          {"user_id": user_id})
+        return bool(exists_row[0]) if exists_row else False
+
+    async def create_batch(self, users_data, chunk_size: int = 500):
+        """Пакетная вставка многострочными INSERT, дубликаты пропускаются"""
+        rows_affected = 0
+        async with self.__db.begin() as conn:
+            for chunk in chunked(users_data, chunk_size):
+                result = await conn.execute(
+                    bulk_insert_script(len(chunk)),
+                    bulk_insert_params(chunk))
+                rows_affected += result.rowcount
+        return rows_affected
+
+    async def get_user_as_dict(self, user_id: int):
+        row = await self.get(user_id)
+        if row:
+            return {
+                'user_id': row[0],
+                'user_email': row[1],
+                'subject_id': row[2]
+            }
+        return None
+
+    async def get_all_as_dicts(self):
+        rows = await self.get_all()
+        return [
+            {
+                'user_id': row[0],
+                'user_email': row[1],
+                'subject_id': row[2]
+            }
+            for row in rows
+        ]
+
+    async def update_email(self, user_id: int, new_email: str):
+        user = await self.get(user_id)
+        if not user:
+            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+
+        return await self.update(user_id, new_email, user[2])
+
+    async def update_subject(self, user_id: int, new_subject_id: int):
+        user = await self.get(user_id)
+        if not user:
+            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+
+        return await self.update(user_id, user[1], new_subject_id)
+
+    async def search_users(self, email_pattern=None, min_subject_id=None,
+                           max_subject_id=None):
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id)
+        return await self._fetchall(search, params)
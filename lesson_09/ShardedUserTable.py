@@ -0,0 +1,152 @@
+import bisect
+import hashlib
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from UsersTable import UserTable
+
+
+def _hash(value: str):
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing:
+    """Кольцо согласованного хеширования с виртуальными узлами
+
+    При добавлении или удалении узла переезжает только ~1/N ключей.
+    """
+
+    def __init__(self, nodes, virtual_nodes: int = 100):
+        self._ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(virtual_nodes)
+        )
+        if not self._ring:
+            raise ValueError("Нужен хотя бы один узел")
+        self._hashes = [point for point, _ in self._ring]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, _hash(str(key)))
+        return self._ring[index % len(self._ring)][1]
+
+
+class ShardedUserTable:
+    """UserTable поверх нескольких баз, шардированных по user_id
+
+    shards - {имя шарда: строка подключения}. Кольцо согласованного
+    хеширования строится по именам, поэтому смена пароля или хоста в
+    строке подключения не переносит пользователей в другой шард.
+    Запросы по одному user_id идут в шард, выбранный кольцом.
+    get_all/count/search_users/get_by_email выполняются во всех шардах
+    параллельно в пуле потоков, результаты объединяются (строки
+    упорядочиваются по user_id).
+    """
+
+    def __init__(self, shards, max_workers: int = None,
+                 virtual_nodes: int = 100, **table_options):
+        if not isinstance(shards, Mapping):
+            raise ValueError(
+                "shards - словарь {имя шарда: строка подключения}")
+        if not shards:
+            raise ValueError("Нужен хотя бы один шард")
+        self.shards = {
+            name: UserTable(connection_string, **table_options)
+            for name, connection_string in shards.items()
+        }
+        self._ring = ConsistentHashRing(self.shards, virtual_nodes)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards),
+            thread_name_prefix="user-shard")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        for shard in self.shards.values():
+            shard.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def shard_for(self, user_id: int):
+        """Шард (UserTable), в котором хранится пользователь"""
+        return self.shards[self._ring.node_for(user_id)]
+
+    def _fan_out(self, method: str, *args):
+        """Вызов метода во всех шардах параллельно, список результатов"""
+        futures = [self._pool.submit(getattr(shard, method), *args)
+                   for shard in self.shards.values()]
+        return [future.result() for future in futures]
+
+    def _merge_rows(self, results):
+        rows = [row for rows in results for row in rows]
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def create(self, user_id: int, user_email: str, subject_id: int):
+        return self.shard_for(user_id).create(user_id, user_email,
+                                              subject_id)
+
+    def get(self, user_id: int):
+        return self.shard_for(user_id).get(user_id)
+
+    def update(self, user_id: int, user_email: str, subject_id: int):
+        return self.shard_for(user_id).update(user_id, user_email,
+                                              subject_id)
+
+    def update_email(self, user_id: int, new_email: str):
+        return self.shard_for(user_id).update_email(user_id, new_email)
+
+    def update_subject(self, user_id: int, new_subject_id: int):
+        return self.shard_for(user_id).update_subject(user_id,
+                                                      new_subject_id)
+
+    def delete(self, user_id: int):
+        return self.shard_for(user_id).delete(user_id)
+
+    def check_exists(self, user_id: int):
+        return self.shard_for(user_id).check_exists(user_id)
+
+    def get_user_as_dict(self, user_id: int):
+        return self.shard_for(user_id).get_user_as_dict(user_id)
+
+    def create_batch(self, users_data, bulk: bool = True):
+        """Пакетная вставка: строки группируются по шардам"""
+        by_shard = {}
+        for user in users_data:
+            by_shard.setdefault(self._ring.node_for(user[0]), []).append(user)
+
+        futures = [
+            self._pool.submit(self.shards[node].create_batch, users, bulk)
+            for node, users in by_shard.items()
+        ]
+        return sum(future.result() for future in futures)
+
+    def get_all(self):
+        return self._merge_rows(self._fan_out("get_all"))
+
+    def get_all_as_dicts(self):
+        return [
+            {
+                'user_id': row[0],
+                'user_email': row[1],
+                'subject_id': row[2]
+            }
+            for row in self.get_all()
+        ]
+
+    def count(self):
+        return sum(self._fan_out("count"))
+
+    def search_users(self, email_pattern=None, min_subject_id=None,
+                     max_subject_id=None):
+        return self._merge_rows(self._fan_out(
+            "search_users", email_pattern, min_subject_id, max_subject_id))
+
+    def get_by_email(self, user_email: str):
+        return self._merge_rows(self._fan_out("get_by_email", user_email))
+
+    def delete_all(self):
+        return sum(self._fan_out("delete_all"))
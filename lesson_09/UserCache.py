@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Число счётчиков поколений: user_id делят их по остатку от хэша
+GENERATION_SLOTS = 4096
+
+
+class UserCache:
+    """LRU-кэш с ограничением по размеру и сроком жизни записей (TTL)
+
+    Ключи - кортежи вида (вид запроса, user_id, ...). Записи с user_id
+    None (агрегаты по всей таблице) сбрасываются при любой записи.
+    Индекс user_id -> ключи делает сброс пропорциональным числу записей
+    пользователя, а не размеру кэша. Потокобезопасен.
+
+    Чтобы значение, прочитанное до записи, не попало в кэш после её
+    сброса, загрузка идёт так: generation(key) до чтения из базы, затем
+    put(key, value, generation). Если за это время invalidate/clear
+    сбросили ключ, поколение изменилось и put ничего не сохраняет.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        if max_size < 1:
+            raise ValueError("max_size должен быть положительным")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # Ключи по user_id и ключи агрегатов (user_id None)
+        self._by_user = {}
+        self._table_keys = set()
+        # Поколения: общее (clear), агрегатов и по слотам user_id
+        self._epoch = 0
+        self._table_generation = 0
+        self._generations = [0] * GENERATION_SLOTS
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key):
+        """Значение по ключу либо MISSING"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _keys_for(self, user_id):
+        if user_id is None:
+            return self._table_keys
+        return self._by_user.setdefault(user_id, set())
+
+    def _remove(self, key):
+        del self._data[key]
+        keys = self._keys_for(key[1])
+        keys.discard(key)
+        if not keys and key[1] is not None:
+            del self._by_user[key[1]]
+
+    def _generation(self, user_id):
+        if user_id is None:
+            return self._epoch, self._table_generation
+        return (self._epoch,
+                self._generations[hash(user_id) % GENERATION_SLOTS])
+
+    def generation(self, key):
+        """Поколение ключа: снимается перед загрузкой значения из базы"""
+        with self._lock:
+            return self._generation(key[1])
+
+    def put(self, key, value, generation=None):
+        """Сохранение значения; с generation - только если ключ не
+        сбрасывался после generation(key)"""
+        expires_at = (time.monotonic() + self.ttl
+                      if self.ttl is not None else None)
+        with self._lock:
+            if generation is not None and \
+                    generation != self._generation(key[1]):
+                self.stale_puts += 1
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            self._keys_for(key[1]).add(key)
+            while len(self._data) > self.max_size:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        """Удаление записей пользователя и агрегатов по таблице"""
+        with self._lock:
+            self._generations[hash(user_id) % GENERATION_SLOTS] += 1
+            self._table_generation += 1
+            keys = list(self._by_user.get(user_id, ()))
+            keys.extend(self._table_keys)
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._by_user.clear()
+            self._table_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
@@ -0,0 +1,149 @@
+import csv
+import io
+import time
+from itertools import islice
+
+from sqlalchemy.sql import text
+
+
+class LoadResult:
+    """Итог загрузки: число строк, время и скорость"""
+
+    def __init__(self, rows: int, seconds: float, method: str):
+        self.rows = rows
+        self.seconds = seconds
+        self.method = method
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return (f"LoadResult(rows={self.rows}, seconds={self.seconds:.3f}, "
+                f"rows_per_sec={self.rows_per_sec:.0f}, "
+                f"method={self.method!r})")
+
+
+class _CsvRowsReader(io.RawIOBase):
+    """Файлоподобный объект, лениво отдающий строки в формате CSV для COPY"""
+
+    def __init__(self, rows, on_rows):
+        self._rows = iter(rows)
+        self._on_rows = on_rows
+        self._buffer = b""
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator="\n")
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._out.seek(0)
+            self._out.truncate()
+            self._writer.writerow(row)
+            self._buffer += self._out.getvalue().encode("utf-8")
+            self._on_rows(1)
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class UserLoader:
+    """Потоковая загрузка строк в таблицу users поверх UserTable
+
+    На PostgreSQL используется COPY FROM STDIN, на остальных СУБД -
+    пачки executemany. Запись идёт через table.bulk_load_connection():
+    внутри table.transaction() загрузка (и COPY тоже) становится частью
+    этой транзакции и фиксируется или откатывается вместе с ней.
+    """
+
+    COPY_SQL = ("COPY users (user_id, user_email, subject_id) "
+                "FROM STDIN WITH (FORMAT csv)")
+    INSERT_SQL = text("""
+        INSERT INTO users (user_id, user_email, subject_id)
+        VALUES (:user_id, :user_email, :subject_id)
+    """)
+
+    def __init__(self, table, chunk_size: int = 10000,
+                 progress_callback=None, progress_every: int = 10000):
+        self.table = table
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.progress_every = progress_every
+        self._loaded = 0
+        self._reported = 0
+
+    def load_rows(self, rows):
+        """Загрузка из iterable кортежей (user_id, user_email, subject_id)"""
+        self._loaded = 0
+        self._reported = 0
+        started = time.perf_counter()
+
+        if self.table.engine.dialect.name == "postgresql":
+            method = "copy"
+            self._copy(rows)
+        else:
+            method = "executemany"
+            self._insert_chunks(rows)
+
+        if self._loaded != self._reported:
+            self._report_progress()
+        return LoadResult(self._loaded, time.perf_counter() - started,
+                          method)
+
+    def load_csv(self, source, has_header: bool = True):
+        """Загрузка из CSV-файла (путь или открытый текстовый файл)"""
+        if isinstance(source, str):
+            with open(source, newline="", encoding="utf-8") as f:
+                return self.load_csv(f, has_header)
+
+        reader = csv.reader(source)
+        if has_header:
+            next(reader, None)
+        return self.load_rows(
+            (int(user_id), user_email, int(subject_id))
+            for user_id, user_email, subject_id in reader)
+
+    def _rows_loaded(self, count: int):
+        before = self._loaded
+        self._loaded += count
+        if before // self.progress_every != \
+                self._loaded // self.progress_every:
+            self._report_progress()
+
+    def _report_progress(self):
+        self._reported = self._loaded
+        if self.progress_callback:
+            self.progress_callback(self._loaded)
+
+    def _copy(self, rows):
+        # COPY выполняется курсором DBAPI-соединения, на котором открыта
+        # транзакция SQLAlchemy, поэтому фиксируется вместе с ней
+        with self.table.bulk_load_connection() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.copy_expert(self.COPY_SQL,
+                                   _CsvRowsReader(rows, self._rows_loaded))
+            finally:
+                cursor.close()
+
+    def _insert_chunks(self, rows):
+        iterator = iter(rows)
+        with self.table.bulk_load_connection() as conn:
+            while True:
+                chunk = [
+                    {"user_id": user_id, "user_email": user_email,
+                     "subject_id": subject_id}
+                    for user_id, user_email, subject_id
+                    in islice(iterator, self.chunk_size)
+                ]
+                if not chunk:
+                    break
+                conn.execute(self.INSERT_SQL, chunk)
+                self._rows_loaded(len(chunk))
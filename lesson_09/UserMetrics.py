@@ -0,0 +1,152 @@
+import functools
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger("UsersTable")
+
+
+def _normalize(statement: str):
+    """Запрос в одну строку: ключ для статистики по запросам"""
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+def _label(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+class QueryMetrics:
+    """Инструментирование UserTable: методы, запросы, медленные запросы
+
+    - по каждому публичному методу: число вызовов, суммарное/максимальное
+      время и число обращений к базе (round trips);
+    - по каждому запросу: число выполнений и время (события
+      before_cursor_execute/after_cursor_execute);
+    - запросы дольше slow_query_seconds пишутся в лог "UsersTable".
+    Экспорт: as_dict() и to_prometheus().
+    """
+
+    def __init__(self, slow_query_seconds: float = None,
+                 prefix: str = "usertable"):
+        self.slow_query_seconds = slow_query_seconds
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.methods = {}
+        self.statements = {}
+        self.slow_queries = 0
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def wrap(self, name: str, method):
+        """Обёртка метода с замером времени и подсчётом round trips"""
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            entry = [0]
+            stack.append(entry)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                stack.pop()
+                self._record_method(name, elapsed, entry[0])
+        return wrapper
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        self._local.started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        elapsed = time.perf_counter() - getattr(self._local, "started",
+                                                time.perf_counter())
+        # Обращение к базе засчитывается всем вложенным вызовам методов
+        for entry in self._stack():
+            entry[0] += 1
+
+        key = _normalize(statement)
+        with self._lock:
+            stats = self.statements.setdefault(
+                key, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            slow = self.slow_query_seconds is not None and \
+                elapsed >= self.slow_query_seconds
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            logger.warning("Медленный запрос (%.3f с): %s", elapsed, key)
+
+    def _record_method(self, name: str, elapsed: float, round_trips: int):
+        with self._lock:
+            stats = self.methods.setdefault(
+                name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                       "round_trips": 0})
+            stats["calls"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            stats["round_trips"] += round_trips
+
+    def reset(self):
+        with self._lock:
+            self.methods.clear()
+            self.statements.clear()
+            self.slow_queries = 0
+
+    def as_dict(self):
+        with self._lock:
+            methods = {}
+            for name, stats in self.methods.items():
+                methods[name] = dict(
+                    stats,
+                    round_trips_per_call=stats["round_trips"] / stats["calls"])
+            return {
+                "methods": methods,
+                "statements": {key: dict(stats)
+                               for key, stats in self.statements.items()},
+                "slow_queries": self.slow_queries,
+            }
+
+    def to_prometheus(self):
+        """Метрики в текстовом формате Prometheus"""
+        data = self.as_dict()
+        p = self.prefix
+        series = [
+            ("method_calls_total", "counter", "Вызовы методов UserTable",
+             "method", data["methods"], "calls"),
+            ("method_seconds_total", "counter", "Время в методах UserTable",
+             "method", data["methods"], "total_seconds"),
+            ("method_round_trips_total", "counter",
+             "Обращения к базе из методов UserTable",
+             "method", data["methods"], "round_trips"),
+            ("statement_executions_total", "counter", "Выполнения запросов",
+             "statement", data["statements"], "count"),
+            ("statement_seconds_total", "counter", "Время выполнения запросов",
+             "statement", data["statements"], "total_seconds"),
+        ]
+        lines = []
+        for name, kind, help_text, label, items, field in series:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for key, stats in items.items():
+                lines.append(
+                    f'{p}_{name}{{{label}="{_label(key)}"}} {stats[field]}')
+        lines.append(f"# HELP {p}_slow_queries_total Медленные запросы")
+        lines.append(f"# TYPE {p}_slow_queries_total counter")
+        lines.append(f"{p}_slow_queries_total {data['slow_queries']}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+
+class PoolStats:
+    """Метрики пула соединений engine на основе событий пула SQLAlchemy
+
+    Время ожидания соединения измеряется в connect(), через который
+    UserTable получает все соединения. Инвалидация соединения во время
+    такого ожидания считается неудачным pre-ping.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_overflow = 0
+
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def connect(self, engine=None):
+        """engine.connect() с замером времени ожидания соединения"""
+        self._local.in_checkout = True
+        started = time.perf_counter()
+        try:
+            return (engine or self.engine).connect()
+        finally:
+            waited = time.perf_counter() - started
+            self._local.in_checkout = False
+            with self._lock:
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy):
+        overflow = self._pool_value("overflow")
+        with self._lock:
+            self.checkouts += 1
+            if overflow is not None:
+                self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record,
+                       exception):
+        with self._lock:
+            self.invalidations += 1
+            if getattr(self._local, "in_checkout", False):
+                self.pre_ping_failures += 1
+
+    def _pool_value(self, name: str):
+        # У NullPool/StaticPool нет size()/overflow()/checkedout()
+        method = getattr(self.engine.pool, name, None)
+        return method() if method else None
+
+    def stats(self):
+        overflow = self._pool_value("overflow")
+        with self._lock:
+            return {
+                "pool_class": type(self.engine.pool).__name__,
+                "pool_size": self._pool_value("size"),
+                "checked_out": self._pool_value("checkedout"),
+                "overflow": max(overflow, 0) if overflow is not None
+                else None,
+                "peak_overflow": self.peak_overflow,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "pre_ping_failures": self.pre_ping_failures,
+                "wait_total": self.wait_total,
+                "wait_max": self.wait_max,
+                "wait_avg": self.wait_total / self.checkouts
+                if self.checkouts else 0.0,
+            }
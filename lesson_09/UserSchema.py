@@ -0,0 +1,277 @@
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+
+from UsersTable import build_search
+
+# Таблица users, с которой работают UserTable, бенчмарки и тесты
+USERS_DDL = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        user_email VARCHAR(255),
+        subject_id INTEGER
+    )
+"""
+
+# Журнал изменений users для UserTable.iter_changes.
+# change_id должен расти в порядке фиксации транзакций, иначе читатель,
+# дошедший до id 11, навсегда пропустит id 10 из транзакции, которая
+# зафиксируется позже. На PostgreSQL триггер отложен до COMMIT и берёт
+# транзакционную advisory-блокировку: id выдаются по одному в момент
+# фиксации, а блокировка снимается уже после того, как запись видна.
+# В SQLite пишет только одна транзакция за раз, порядок и так верный.
+CHANGE_FEED_DDL = {
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS users_changes (
+            change_id BIGSERIAL PRIMARY KEY,
+            operation CHAR(1) NOT NULL,
+            user_id INTEGER NOT NULL,
+            user_email VARCHAR(255),
+            subject_id INTEGER,
+            changed_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION users_log_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('users_changes'));
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO users_changes (operation, user_id)
+                VALUES ('D', OLD.user_id);
+            ELSE
+                INSERT INTO users_changes
+                    (operation, user_id, user_email, subject_id)
+                VALUES (left(TG_OP, 1), NEW.user_id, NEW.user_email,
+                        NEW.subject_id);
+            END IF;
+            PERFORM pg_notify('users_changes', TG_OP || ' ' ||
+                              COALESCE(NEW.user_id, OLD.user_id));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS users_change_log ON users",
+        """
+        CREATE CONSTRAINT TRIGGER users_change_log
+        AFTER INSERT OR UPDATE OR DELETE ON users
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION users_log_change()
+        """,
+    ],
+    "sqlite": [
+        """
+        CREATE TABLE IF NOT EXISTS users_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            operation CHAR(1) NOT NULL,
+            user_id INTEGER NOT NULL,
+            user_email VARCHAR(255),
+            subject_id INTEGER,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_change_log_insert
+        AFTER INSERT ON users
+        BEGIN
+            INSERT INTO users_changes
+                (operation, user_id, user_email, subject_id)
+            VALUES ('I', NEW.user_id, NEW.user_email, NEW.subject_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_change_log_update
+        AFTER UPDATE ON users
+        BEGIN
+            INSERT INTO users_changes
+                (operation, user_id, user_email, subject_id)
+            VALUES ('U', NEW.user_id, NEW.user_email, NEW.subject_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_change_log_delete
+        AFTER DELETE ON users
+        BEGIN
+            INSERT INTO users_changes (operation, user_id)
+            VALUES ('D', OLD.user_id);
+        END
+        """,
+    ],
+}
+
+
+class UserSchema:
+    """Управление индексами таблицы users и проверка планов запросов
+
+    Индексы:
+      users_user_email_idx      - btree (или unique) по user_email для
+                                  get_by_email
+      users_subject_id_idx      - btree по subject_id для диапазонов
+                                  в search_users
+      users_user_email_trgm_idx - GIN pg_trgm для LIKE '%...%'
+                                  (только PostgreSQL)
+    """
+
+    EMAIL_INDEX = "users_user_email_idx"
+    SUBJECT_INDEX = "users_subject_id_idx"
+    TRGM_INDEX = "users_user_email_trgm_idx"
+    INDEX_SCAN_MARKERS = ("Index Scan", "Index Only Scan",
+                          "Bitmap Index Scan", "USING INDEX",
+                          "USING COVERING INDEX")
+
+    def __init__(self, table):
+        self.table = table
+        self.engine = table.engine
+
+    @property
+    def is_postgres(self):
+        return self.engine.dialect.name == "postgresql"
+
+    def index_scripts(self, unique_email: bool = False):
+        """DDL индексов для текущей СУБД: {имя индекса: [команды]}"""
+        unique = "UNIQUE " if unique_email else ""
+        scripts = {
+            self.EMAIL_INDEX: [
+                f"CREATE {unique}INDEX IF NOT EXISTS {self.EMAIL_INDEX} "
+                "ON users (user_email)"],
+            self.SUBJECT_INDEX: [
+                f"CREATE INDEX IF NOT EXISTS {self.SUBJECT_INDEX} "
+                "ON users (subject_id)"],
+        }
+        if self.is_postgres:
+            scripts[self.TRGM_INDEX] = [
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                f"CREATE INDEX IF NOT EXISTS {self.TRGM_INDEX} "
+                "ON users USING gin (user_email gin_trgm_ops)"]
+        return scripts
+
+    def expected_indexes(self, unique_email: bool = False):
+        """{имя индекса: (должен ли быть уникальным, метод доступа)}"""
+        expected = {
+            self.EMAIL_INDEX: (unique_email, None),
+            self.SUBJECT_INDEX: (False, None),
+        }
+        if self.is_postgres:
+            expected[self.TRGM_INDEX] = (False, "gin")
+        return expected
+
+    @staticmethod
+    def _matches(index, unique: bool, using: str):
+        """Совпадает ли индекс из get_indexes с ожидаемыми свойствами"""
+        if unique and not index.get("unique"):
+            return False
+        if using is not None and index.get("dialect_options", {}).get(
+                "postgresql_using") != using:
+            return False
+        return True
+
+    def ensure_indexes(self, unique_email: bool = False):
+        """Создание недостающих и пересоздание несовпадающих индексов
+
+        Несовпадающий - например, обычный users_user_email_idx при
+        unique_email=True. Возвращает имена созданных индексов; если
+        уникальный индекс не построить из-за повторяющихся email -
+        ValueError, существующие индексы не трогаются.
+        """
+        existing = self._indexes()
+        expected = self.expected_indexes(unique_email)
+        rebuild = [name for name in expected if name in existing and
+                   not self._matches(existing[name], *expected[name])]
+        if unique_email and (self.EMAIL_INDEX in rebuild or
+                             self.EMAIL_INDEX not in existing):
+            self._check_unique_emails()
+
+        created = []
+        with self.engine.begin() as conn:
+            for name, scripts in self.index_scripts(unique_email).items():
+                if name in existing and name not in rebuild:
+                    continue
+                if name in rebuild:
+                    conn.execute(text(f"DROP INDEX {name}"))
+                for script in scripts:
+                    conn.execute(text(script))
+                created.append(name)
+        return created
+
+    def _check_unique_emails(self):
+        # Проверка до DROP INDEX: pysqlite выполняет DDL вне транзакции,
+        # и неудачный CREATE UNIQUE INDEX не вернул бы старый индекс
+        with self.engine.connect() as conn:
+            duplicate = conn.execute(text(
+                "SELECT user_email FROM users WHERE user_email IS NOT NULL "
+                "GROUP BY user_email HAVING COUNT(*) > 1 LIMIT 1")).first()
+        if duplicate is not None:
+            raise ValueError(
+                f"Нельзя создать уникальный индекс {self.EMAIL_INDEX}: "
+                f"email {duplicate[0]!r} встречается несколько раз")
+
+    def _indexes(self):
+        return {index["name"]: index
+                for index in inspect(self.engine).get_indexes("users")}
+
+    def existing_indexes(self):
+        """Имена индексов, уже существующих на таблице users"""
+        return set(self._indexes())
+
+    def verify_indexes(self, unique_email: bool = False):
+        """{имя индекса: есть ли он в базе с нужными свойствами}
+
+        Проверяются не только имена, но и уникальность индекса email
+        (при unique_email=True) и метод GIN для триграммного индекса.
+        """
+        existing = self._indexes()
+        return {name: name in existing and self._matches(existing[name],
+                                                         *properties)
+                for name, properties in
+                self.expected_indexes(unique_email).items()}
+
+    def install_change_feed(self):
+        """Создание журнала users_changes и триггеров, которые его пишут
+
+        На PostgreSQL триггер отложен до COMMIT и сериализует запись
+        журнала, поэтому change_id идут в порядке фиксации (ценой
+        очереди пишущих транзакций на время их COMMIT). Он же шлёт
+        NOTIFY users_changes, так что потребители могут ждать изменений
+        через LISTEN вместо опроса. На SQLite журнал ведут три триггера
+        AFTER INSERT/UPDATE/DELETE.
+        """
+        scripts = CHANGE_FEED_DDL.get(self.engine.dialect.name)
+        if scripts is None:
+            raise NotImplementedError(
+                f"Журнал изменений не поддерживается для "
+                f"{self.engine.dialect.name}")
+        with self.engine.begin() as conn:
+            for script in scripts:
+                conn.exec_driver_sql(script)
+
+    def change_feed_installed(self):
+        return inspect(self.engine).has_table("users_changes")
+
+    def explain_search(self, email_pattern=None, min_subject_id=None,
+                       max_subject_id=None, disable_seqscan: bool = False):
+        """План запроса search_users в виде списка строк
+
+        disable_seqscan=True запрещает PostgreSQL seq scan в рамках
+        транзакции: на маленьких тестовых таблицах планировщик иначе
+        всегда выбирает полный просмотр.
+        """
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id)
+
+        with self.engine.begin() as conn:
+            if self.is_postgres:
+                if disable_seqscan:
+                    conn.execute(text("SET LOCAL enable_seqscan = off"))
+                rows = conn.execute(text("EXPLAIN " + search.text), params)
+                return [row[0] for row in rows]
+
+            rows = conn.execute(text("EXPLAIN QUERY PLAN " + search.text),
+                                params)
+            # Последняя колонка EXPLAIN QUERY PLAN в SQLite - detail
+            return [row[-1] for row in rows]
+
+    def search_uses_index(self, email_pattern=None, min_subject_id=None,
+                          max_subject_id=None,
+                          disable_seqscan: bool = False):
+        plan = "\n".join(self.explain_search(
+            email_pattern, min_subject_id, max_subject_id, disable_seqscan))
+        return any(marker in plan for marker in self.INDEX_SCAN_MARKERS)
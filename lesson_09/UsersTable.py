@@ -1,164 +1,855 @@
+import base64
+from array import array
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import count as counter, islice
+from typing import NamedTuple
+
 from sqlalchemy import create_engine
-from sqlalchemy.sql import text
+from sqlalchemy.sql import bindparam, text
+
+from UserCache import MISSING, UserCache
+from UserPoolStats import PoolStats
+
+
+def chunked(iterable, size):
+    """Разбиение любого iterable (в т.ч. генератора) на списки по size"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _encode_page_token(user_id: int):
+    return base64.urlsafe_b64encode(str(user_id).encode()).decode()
+
+
+def _decode_page_token(page_token: str):
+    try:
+        return int(base64.urlsafe_b64decode(page_token.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Некорректный токен страницы: {page_token!r}")
+
+
+USER_SCRIPTS = {
+    "select": text("SELECT * FROM users WHERE user_id = :user_id"),
+    "select_all": text("SELECT * FROM users"),
+    "insert": text("""
+        INSERT INTO users (user_id, user_email, subject_id)
+        VALUES (:user_id, :user_email, :subject_id)
+    """),
+    "update": text("""
+        UPDATE users
+        SET user_email = :user_email, subject_id = :subject_id
+        WHERE user_id = :user_id
+    """),
+    "delete": text("DELETE FROM users WHERE user_id = :user_id"),
+    "delete_all": text("DELETE FROM users"),
+    "count": text("SELECT COUNT(*) FROM users"),
+    "select_by_email": text(
+        "SELECT * FROM users WHERE user_email = :user_email"),
+    "check_exists": text(
+        "SELECT EXISTS(SELECT 1 FROM users WHERE user_id = :user_id)"),
+    "insert_if_absent": text("""
+        INSERT INTO users (user_id, user_email, subject_id)
+        VALUES (:user_id, :user_email, :subject_id)
+        ON CONFLICT (user_id) DO NOTHING
+    """),
+    "update_email": text("""
+        UPDATE users SET user_email = :user_email
+        WHERE user_id = :user_id
+    """),
+    "update_subject": text("""
+        UPDATE users SET subject_id = :subject_id
+        WHERE user_id = :user_id
+    """),
+    "count_by_subject": text("""
+        SELECT subject_id, COUNT(*) FROM users
+        GROUP BY subject_id ORDER BY subject_id
+    """),
+    "select_changes": text("""
+        SELECT change_id, operation, user_id, user_email, subject_id
+        FROM users_changes
+        WHERE change_id > :since
+        ORDER BY change_id
+        LIMIT :batch_size
+    """),
+    "last_change_id": text("SELECT MAX(change_id) FROM users_changes"),
+    # Начало диапазона с округлением вниз и для отрицательных subject_id:
+    # % в SQL усекает к нулю, ((x % b) + b) % b - остаток от 0 до b - 1
+    "subject_histogram": text("""
+        SELECT subject_id - ((subject_id % :bucket_size) + :bucket_size)
+               % :bucket_size AS bucket,
+               COUNT(*)
+        FROM users
+        WHERE subject_id IS NOT NULL
+        GROUP BY bucket ORDER BY bucket
+    """)
+}
+
+
+def _count_by_email_domain_script(position: str):
+    """Подсчёт по домену (всё после первого @; без @ или NULL - '')"""
+    return text(f"""
+        SELECT CASE WHEN {position} > 0
+                    THEN lower(substr(user_email, {position} + 1))
+                    ELSE '' END AS domain,
+               COUNT(*)
+        FROM users
+        GROUP BY domain ORDER BY domain
+    """)
+
+
+# Поиск @ в строке называется по-разному в разных СУБД
+COUNT_BY_EMAIL_DOMAIN_SCRIPTS = {
+    "postgresql": _count_by_email_domain_script("strpos(user_email, '@')"),
+    "default": _count_by_email_domain_script("instr(user_email, '@')"),
+}
+
+
+# Многострочные INSERT для create_batch(bulk=True) по размеру пачки
+_bulk_scripts = {}
+
+
+def bulk_insert_script(rows_count: int):
+    """Многострочный INSERT, пропускающий конфликты по user_id
+
+    ON CONFLICT (user_id) понимают и PostgreSQL, и SQLite (3.24+); в
+    отличие от INSERT OR IGNORE, нарушения других ограничений
+    (NOT NULL, CHECK) не глотаются, а дают ошибку.
+    """
+    script = _bulk_scripts.get(rows_count)
+    if script is None:
+        values = ", ".join(
+            f"(:user_id_{i}, :user_email_{i}, :subject_id_{i})"
+            for i in range(rows_count))
+        script = text(
+            "INSERT INTO users (user_id, user_email, subject_id) "
+            f"VALUES {values} ON CONFLICT (user_id) DO NOTHING")
+        _bulk_scripts[rows_count] = script
+    return script
+
+
+# UPDATE ... FROM (VALUES ...) для update_many на PostgreSQL
+_bulk_update_scripts = {}
+
+
+def bulk_update_script(rows_count: int):
+    """UPDATE нескольких пользователей одним запросом (PostgreSQL)"""
+    script = _bulk_update_scripts.get(rows_count)
+    if script is None:
+        values = ", ".join(
+            f"(CAST(:user_id_{i} AS INTEGER), CAST(:user_email_{i} AS TEXT), "
+            f"CAST(:subject_id_{i} AS INTEGER))"
+            for i in range(rows_count))
+        script = text(f"""
+            UPDATE users AS u
+            SET user_email = v.user_email, subject_id = v.subject_id
+            FROM (VALUES {values}) AS v (user_id, user_email, subject_id)
+            WHERE u.user_id = v.user_id
+        """)
+        _bulk_update_scripts[rows_count] = script
+    return script
+
+
+DELETE_MANY_SCRIPTS = {
+    "postgresql": text("DELETE FROM users WHERE user_id = ANY(:user_ids)"),
+    "default": text(
+        "DELETE FROM users WHERE user_id IN :user_ids").bindparams(
+        bindparam("user_ids", expanding=True)),
+}
+
+
+def bulk_insert_params(chunk):
+    params = {}
+    for i, (user_id, user_email, subject_id) in enumerate(chunk):
+        params[f"user_id_{i}"] = user_id
+        params[f"user_email_{i}"] = user_email
+        params[f"subject_id_{i}"] = subject_id
+    return params
+
+
+@lru_cache(maxsize=None)
+def search_script(email: bool, min_subject: bool, max_subject: bool,
+                  paging=None):
+    """Запрос поиска для набора фильтров, создаётся один раз на комбинацию
+
+    Один и тот же объект text() на каждую комбинацию фильтров позволяет
+    SQLAlchemy брать скомпилированный запрос из кэша, а драйверу -
+    переиспользовать подготовленный запрос. Все значения - bind-параметры.
+    paging: None или (есть ли курсор страницы, backward) для keyset-пагинации.
+    """
+    query = "SELECT * FROM users WHERE 1=1"
+    if email:
+        query += " AND user_email LIKE :email_pattern"
+    if min_subject:
+        query += " AND subject_id >= :min_subject_id"
+    if max_subject:
+        query += " AND subject_id <= :max_subject_id"
+
+    if paging is not None:
+        has_cursor, backward = paging
+        if has_cursor:
+            query += (" AND user_id < :page_cursor" if backward
+                      else " AND user_id > :page_cursor")
+        query += (" ORDER BY user_id DESC" if backward
+                  else " ORDER BY user_id")
+        query += " LIMIT :page_limit"
+    return text(query)
+
+
+def build_search(email_pattern=None, min_subject_id=None,
+                 max_subject_id=None, paging=None):
+    """Запрос и параметры поиска пользователей по набору фильтров"""
+    params = {}
+
+    if email_pattern:
+        params['email_pattern'] = f"%{email_pattern}%"
+
+    if min_subject_id is not None:
+        params['min_subject_id'] = min_subject_id
+
+    if max_subject_id is not None:
+        params['max_subject_id'] = max_subject_id
+
+    script = search_script(bool(email_pattern), min_subject_id is not None,
+                           max_subject_id is not None, paging)
+    return script, params
+
+
+def _arrow_int64(values):
+    """pyarrow int64 поверх памяти array('q') без обхода элементов"""
+    import pyarrow
+    return pyarrow.Array.from_buffers(
+        pyarrow.int64(), len(values), [None, pyarrow.py_buffer(values)])
+
+
+class User(NamedTuple):
+    """Компактная запись пользователя
+
+    Кортеж без __dict__: занимает меньше памяти, чем dict или Row, и
+    сохраняет доступ по индексу (user[0], user[1], user[2]).
+    """
+
+    user_id: int
+    user_email: str
+    subject_id: int
+
+
+ROW_FORMATS = ("row", "user")
+REPLICA_STRATEGIES = ("round_robin", "least_loaded")
+# Публичные методы, которые оборачивает QueryMetrics (генераторы iter_*
+# не оборачиваются: их время - это время потребителя)
+INSTRUMENTED_METHODS = (
+    "create", "get", "get_all", "update", "delete", "delete_all", "count",
+    "get_by_email", "check_exists", "create_batch", "update_many",
+    "delete_many", "get_user_as_dict", "get_all_as_dicts", "update_email",
+    "update_subject", "search_users", "search_users_page", "get_page",
+    "get_all_columnar", "search_users_columnar", "count_by_subject",
+    "count_by_email_domain", "subject_histogram", "last_change_id",
+)
+
+
+class UserChange(NamedTuple):
+    """Запись журнала изменений: operation - 'I', 'U' или 'D'"""
+
+    change_id: int
+    operation: str
+    user_id: int
+    user_email: str
+    subject_id: int
+
+
+class UserPage:
+    """Страница пользователей с токенами перехода вперёд и назад
+
+    next_token передаётся в следующий вызов для движения вперёд,
+    prev_token - вместе с backward=True для движения назад.
+    """
+
+    def __init__(self, rows, next_token=None, prev_token=None):
+        self.rows = rows
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class UserTransaction:
+    """Единица работы над UserTable внутри одной транзакции
+
+    Все методы таблицы, вызванные через объект транзакции (или напрямую
+    у таблицы в том же потоке), выполняются на одном соединении, а
+    фиксация происходит один раз при выходе из table.transaction().
+    """
+
+    def __init__(self, table, connection):
+        self.table = table
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    @contextmanager
+    def savepoint(self):
+        """Вложенная транзакция: при ошибке откатывается только её часть"""
+        with self.table.transaction() as tx:
+            yield tx
 
 
 class UserTable:
-    __scripts = {
-        "select": text("SELECT * FROM users WHERE user_id = :user_id"),
-        "select_all": text("SELECT * FROM users"),
-        "insert": text("""
-            INSERT INTO users (user_id, user_email, subject_id)
-            VALUES (:user_id, :user_email, :subject_id)
-        """),
-        "update": text("""
-            UPDATE users
-            SET user_email = :user_email, subject_id = :subject_id
-            WHERE user_id = :user_id
-        """),
-        "delete": text("DELETE FROM users WHERE user_id = :user_id"),
-        "delete_all": text("DELETE FROM users"),
-        "count": text("SELECT COUNT(*) FROM users"),
-        "select_by_email": text(
-            "SELECT * FROM users WHERE user_email = :user_email"),
-        "check_exists": text(
-            "SELECT EXISTS(SELECT 1 FROM users WHERE user_id = :user_id)")
-    }
-
-    def __init__(self, connection_string):
-        self.__db = create_engine(
-            connection_string,
-            pool_pre_ping=True,
-            echo=False
-        )
+    __scripts = USER_SCRIPTS
+
+    def __init__(self, connection_string, cache_size: int = 0,
+                 cache_ttl: float = None, single_statement: bool = False,
+                 poolclass=None, pool_size: int = None,
+                 max_overflow: int = None, pool_timeout: float = None,
+                 pool_recycle: int = -1, pool_pre_ping: bool = True,
+                 statement_timeout: int = None, row_format: str = "row",
+                 replica_urls=None, replica_strategy: str = "round_robin",
+                 sticky_seconds: float = 1.0, metrics=None):
+        def engine_for(url):
+            return create_engine(
+                url,
+                echo=False,
+                **self._engine_options(
+                    url, poolclass, pool_size, max_overflow,
+                    pool_timeout, pool_recycle, pool_pre_ping,
+                    statement_timeout)
+            )
+
+        self.__db = engine_for(connection_string)
+        self.__pool_stats = PoolStats(self.__db)
+        # Реплики для чтения; после записи чтения sticky_seconds секунд
+        # идут в основную базу, чтобы видеть собственные изменения
+        if replica_strategy not in REPLICA_STRATEGIES:
+            raise ValueError(
+                f"Неизвестная стратегия выбора реплики: {replica_strategy!r}")
+        self.__replicas = [engine_for(url) for url in replica_urls or []]
+        self.__replica_strategy = replica_strategy
+        self.__sticky_seconds = sticky_seconds
+        self.__replica_lock = threading.Lock()
+        self.__replica_turn = counter()
+        self.__replica_active = [0] * len(self.__replicas)
+        self.__replica_reads = [0] * len(self.__replicas)
+        self.__primary_reads = 0
+        self.__last_write = None
+        # Кэш get/check_exists включается при cache_size > 0
+        self.__cache = UserCache(cache_size, cache_ttl) if cache_size \
+            else None
+        # Формат строк чтения: "row" - Row SQLAlchemy, "user" - User
+        if row_format not in ROW_FORMATS:
+            raise ValueError(f"Неизвестный формат строк: {row_format!r}")
+        self.__as_user = row_format == "user"
+        # Запись одним запросом без предварительного check_exists
+        self.__single_statement = single_statement
+        # Активная транзакция текущего потока (см. transaction())
+        self.__local = threading.local()
         self._test_connection()
+        # Инструментирование: QueryMetrics на все engine и публичные методы
+        self.__metrics = metrics
+        if metrics is not None:
+            for engine in [self.__db, *self.__replicas]:
+                metrics.attach(engine)
+            for name in INSTRUMENTED_METHODS:
+                setattr(self, name, metrics.wrap(name, getattr(self, name)))
+
+    @property
+    def engine(self):
+        """Engine SQLAlchemy, через который работает таблица"""
+        return self.__db
+
+    @staticmethod
+    def _engine_options(connection_string, poolclass=None, pool_size=None,
+                        max_overflow=None, pool_timeout=None,
+                        pool_recycle=-1, pool_pre_ping=True,
+                        statement_timeout=None):
+        """Параметры create_engine для настройки пула
+
+        Незаданные параметры не передаются, чтобы не ломать пулы без
+        размера (NullPool/StaticPool). statement_timeout (мс) задаётся
+        только для PostgreSQL.
+        """
+        options = {"pool_pre_ping": pool_pre_ping,
+                   "pool_recycle": pool_recycle}
+        if poolclass is not None:
+            options["poolclass"] = poolclass
+        if pool_size is not None:
+            options["pool_size"] = pool_size
+        if max_overflow is not None:
+            options["max_overflow"] = max_overflow
+        if pool_timeout is not None:
+            options["pool_timeout"] = pool_timeout
+        if statement_timeout is not None and \
+                connection_string.startswith("postgresql"):
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={int(statement_timeout)}"}
+        return options
+
+    def pool_stats(self):
+        """Метрики пула: выдачи соединений, ожидание, overflow, pre-ping"""
+        return self.__pool_stats.stats()
+
+    def query_stats(self):
+        """Метрики методов и запросов или None без QueryMetrics"""
+        return self.__metrics.as_dict() if self.__metrics else None
+
+    def replica_stats(self):
+        """Число чтений из основной базы и из каждой реплики"""
+        with self.__replica_lock:
+            return {
+                "primary_reads": self.__primary_reads,
+                "replica_reads": list(self.__replica_reads),
+                "replica_active": list(self.__replica_active),
+            }
+
+    def _pick_replica(self):
+        """Индекс реплики для чтения или None, если читать из основной"""
+        if not self.__replicas or self.in_transaction:
+            return None
+        if self.__last_write is not None and \
+                time.monotonic() - self.__last_write < self.__sticky_seconds:
+            return None
+        if self.__replica_strategy == "least_loaded":
+            return min(range(len(self.__replicas)),
+                       key=self.__replica_active.__getitem__)
+        return next(self.__replica_turn) % len(self.__replicas)
+
+    @contextmanager
+    def _read_connection(self):
+        """Соединение для чтения: реплика либо основная база"""
+        with self.__replica_lock:
+            index = self._pick_replica()
+            if index is None:
+                self.__primary_reads += 1
+            else:
+                self.__replica_active[index] += 1
+                self.__replica_reads[index] += 1
+
+        if index is None:
+            with self._connection() as connection:
+                yield connection
+            return
+
+        try:
+            with self.__replicas[index].connect() as connection:
+                yield connection
+        finally:
+            with self.__replica_lock:
+                self.__replica_active[index] -= 1
+
+    def _record(self, row):
+        if self.__as_user and row is not None:
+            return User._make(row)
+        return row
+
+    def _records(self, rows):
+        if self.__as_user:
+            return list(map(User._make, rows))
+        return rows
+
+    def cache_stats(self):
+        """Счётчики кэша (hits/misses/evictions...) или None без кэша"""
+        return self.__cache.stats() if self.__cache else None
+
+    def _cached(self, key, load):
+        # Внутри транзакции видны незафиксированные данные - их не кэшируем
+        if self.__cache is None or self.in_transaction:
+            return load()
+        value = self.__cache.get(key)
+        if value is MISSING:
+            # Запись, зафиксированная во время load(), сбросит ключ и
+            # сменит поколение - тогда прочитанное значение не кэшируется
+            generation = self.__cache.generation(key)
+            value = load()
+            self.__cache.put(key, value, generation)
+        return value
+
+    def _invalidate(self, user_id=None):
+        """Сброс кэша после записи: по одному user_id или целиком"""
+        if self.__cache is None:
+            return
+        touched = getattr(self.__local, "touched", None)
+        if touched is not None:
+            # Повторный сброс после завершения транзакции
+            touched.add(user_id)
+        if user_id is None:
+            self.__cache.clear()
+        else:
+            self.__cache.invalidate(user_id)
+
+    @property
+    def in_transaction(self):
+        return getattr(self.__local, "connection", None) is not None
+
+    @contextmanager
+    def transaction(self):
+        """Явная транзакция: with table.transaction() as tx: ...
+
+        Все вызовы методов таблицы внутри блока используют одно соединение
+        и фиксируются одним COMMIT. Вложенный вызов создаёт SAVEPOINT.
+        """
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            with connection.begin_nested():
+                yield UserTransaction(self, connection)
+            return
+
+        with self.__pool_stats.connect() as connection:
+            self.__local.connection = connection
+            self.__local.touched = set()
+            try:
+                with connection.begin():
+                    yield UserTransaction(self, connection)
+            finally:
+                self.__last_write = time.monotonic()
+                touched = self.__local.touched
+                self.__local.connection = None
+                self.__local.touched = None
+                for user_id in touched:
+                    self._invalidate(user_id)
+
+    @contextmanager
+    def _connection(self):
+        """Соединение активной транзакции либо новое соединение"""
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            yield connection
+        else:
+            with self.__pool_stats.connect() as connection:
+                yield connection
+
+    @contextmanager
+    def _begin(self):
+        """Соединение для записи: активная транзакция либо новая,
+        фиксируемая при выходе из блока"""
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            yield connection
+        else:
+            with self.__pool_stats.connect() as connection, \
+                    connection.begin():
+                yield connection
+            self.__last_write = time.monotonic()
+
+    @contextmanager
+    def bulk_load_connection(self):
+        """Соединение для массовой записи в обход методов таблицы
+
+        Присоединяется к активной transaction(), иначе открывает свою
+        транзакцию с COMMIT при выходе из блока. После записи сбрасывает
+        кэш и, как любая запись, на sticky_seconds направляет чтения в
+        основную базу. Используется UserLoader.
+        """
+        with self._begin() as connection:
+            yield connection
+        self._invalidate()
 
     def _test_connection(self):
         try:
-            with self.__db.connect() as conn:
+            with self._connection() as conn:
                 conn.execute("SELECT 1")
         except Exception as e:
             raise ConnectionError(
                 f"Не удалось подключиться к базе данных: {e}")
 
     def create(self, user_id: int, user_email: str, subject_id: int):
+        if self.__single_statement:
+            return self._write_one(
+                "insert_if_absent",
+                {"user_id": user_id, "user_email": user_email,
+                 "subject_id": subject_id},
+                f"Пользователь user_id={user_id} уже существует")
+
         if self.check_exists(user_id):
             raise ValueError(f"Пользователь user_id={user_id} уже существует")
 
-        with self.__db.connect() as conn:
-            try:
-                result = conn.execute(self.__scripts["insert"], {
-                    "user_id": user_id,
-                    "user_email": user_email,
-                    "subject_id": subject_id
-                })
-                conn.execute("COMMIT")
-                return result.rowcount
-            except Exception as e:
-                # Откат транзакции при ошибке
-                conn.execute("ROLLBACK")
-                raise e
+        # Откат транзакции при ошибке выполняет _begin()
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts["insert"], {
+                "user_id": user_id,
+                "user_email": user_email,
+                "subject_id": subject_id
+            })
+        self._invalidate(user_id)
+        return result.rowcount
+
+    def _write_one(self, script_name: str, params: dict,
+                   error_message: str):
+        """Запись одним запросом; rowcount == 0 означает конфликт/отсутствие"""
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts[script_name], params)
+        if result.rowcount == 0:
+            raise ValueError(error_message)
+        self._invalidate(params["user_id"])
+        return result.rowcount
 
     def get(self, user_id: int):
         """Получение пользователя по ID"""
-        with self.__db.connect() as conn:
+        return self._cached(("get", user_id), lambda: self._get(user_id))
+
+    def _get(self, user_id: int):
+        with self._read_connection() as conn:
             result = conn.execute(self.__scripts["select"], {"user_id":
                                                              user_id})
             # В SQLAlchemy 1.4 fetchone() возвращает RowProxy или None
             row = result.fetchone()
-            return row
+            return self._record(row)
 
     def get_all(self):
         """Получение всех пользователей"""
-        with self.__db.connect() as conn:
+        with self._read_connection() as conn:
             result = conn.execute(self.__scripts["select_all"])
             # В SQLAlchemy 1.4 fetchall() возвращает список RowProxy
             rows = result.fetchall()
-            return rows
+            return self._records(rows)
+
+    def iter_all(self, yield_per: int = 1000):
+        """Ленивый обход всех пользователей через серверный курсор"""
+        return self._stream(self.__scripts["select_all"], {}, yield_per)
+
+    def _stream(self, script, params, yield_per: int):
+        """Генератор строк, читающий результат порциями по yield_per
+
+        stream_results=True включает серверный курсор там, где драйвер его
+        поддерживает (psycopg2), так что память не растёт с размером таблицы.
+        """
+        with self._read_connection() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                script, params)
+            for partition in result.partitions(yield_per):
+                yield from self._records(partition)
 
     def update(self, user_id: int, user_email: str, subject_id: int):
         """Обновление данных пользователя"""
+        if self.__single_statement:
+            return self._write_one(
+                "update",
+                {"user_id": user_id, "user_email": user_email,
+                 "subject_id": subject_id},
+                f"Пользователь с user_id={user_id} не найден")
+
         # Проверка существования пользователя перед обновлением
         if not self.check_exists(user_id):
             raise ValueError(f"Пользователь с user_id={user_id} не найден")
 
-        with self.__db.connect() as conn:
-            try:
-                result = conn.execute(self.__scripts["update"], {
-                    "user_id": user_id,
-                    "user_email": user_email,
-                    "subject_id": subject_id
-                })
-                conn.execute("COMMIT")
-                return result.rowcount
-            except Exception as e:
-                conn.execute("ROLLBACK")
-                raise e
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts["update"], {
+                "user_id": user_id,
+                "user_email": user_email,
+                "subject_id": subject_id
+            })
+        self._invalidate(user_id)
+        return result.rowcount
 
     def delete(self, user_id: int):
         """Удаление пользователя по ID"""
+        if self.__single_statement:
+            return self._write_one(
+                "delete", {"user_id": user_id},
+                f"Пользователь с user_id={user_id} не найден")
+
         # Проверка существования пользователя перед удалением
         if not self.check_exists(user_id):
             raise ValueError(f"Пользователь с user_id={user_id} не найден")
 
-        with self.__db.connect() as conn:
-            try:
-                result = conn.execute(self.__scripts["delete"], {"user_id":
-                                                                 user_id})
-                conn.execute("COMMIT")
-                return result.rowcount
-            except Exception as e:
-                conn.execute("ROLLBACK")
-                raise e
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts["delete"], {"user_id":
+                                                             user_id})
+        self._invalidate(user_id)
+        return result.rowcount
 
     def delete_all(self):
         """Удаление всех пользователей (очистка таблицы)"""
-        with self.__db.connect() as conn:
-            try:
-                result = conn.execute(self.__scripts["delete_all"])
-                conn.execute("COMMIT")
-                return result.rowcount
-            except Exception as e:
-                conn.execute("ROLLBACK")
-                raise e
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts["delete_all"])
+        self._invalidate()
+        return result.rowcount
 
     def count(self):
         """Получение количества пользователей в таблице"""
-        with self.__db.connect() as conn:
+        with self._read_connection() as conn:
             result = conn.execute(self.__scripts["count"])
             count_row = result.fetchone()
             return count_row[0] if count_row else 0
 
+    def count_by_subject(self):
+        """Количество пользователей по subject_id: {subject_id: count}"""
+        return self._cached(
+            ("count_by_subject", None),
+            lambda: self._aggregate(self.__scripts["count_by_subject"]))
+
+    def count_by_email_domain(self):
+        """Количество пользователей по домену email: {domain: count}"""
+        script = COUNT_BY_EMAIL_DOMAIN_SCRIPTS.get(
+            self.__db.dialect.name, COUNT_BY_EMAIL_DOMAIN_SCRIPTS["default"])
+        return self._cached(("count_by_email_domain", None),
+                            lambda: self._aggregate(script))
+
+    def subject_histogram(self, bucket_size: int = 10):
+        """Гистограмма subject_id: {начало диапазона: count}
+
+        Диапазоны [0, bucket_size), [bucket_size, 2 * bucket_size), ...;
+        отрицательные - [-bucket_size, 0) и т.д. NULL не учитываются.
+        """
+        if bucket_size < 1:
+            raise ValueError("bucket_size должен быть положительным")
+        return self._cached(
+            ("subject_histogram", None, bucket_size),
+            lambda: self._aggregate(self.__scripts["subject_histogram"],
+                                    {"bucket_size": bucket_size}))
+
+    def _aggregate(self, script, params=None):
+        """GROUP BY-запрос из двух колонок в виде словаря"""
+        with self._read_connection() as conn:
+            result = conn.execute(script, params or {})
+            return {key: count for key, count in result}
+
+    def iter_changes(self, since: int = 0, batch_size: int = 1000):
+        """Изменения users после курсора since (change_id), по порядку
+
+        Требует журнала, созданного UserSchema.install_change_feed().
+        Курсор для следующего вызова - change_id последнего изменения.
+        Журнал выдаёт change_id в порядке фиксации транзакций, поэтому
+        изменение с меньшим id не может появиться после прочитанного:
+        каждое зафиксированное изменение доставляется ровно один раз.
+        """
+        while True:
+            with self._connection() as conn:
+                changes = [UserChange._make(row) for row in conn.execute(
+                    self.__scripts["select_changes"],
+                    {"since": since, "batch_size": batch_size})]
+            yield from changes
+            if len(changes) < batch_size:
+                return
+            since = changes[-1].change_id
+
+    def last_change_id(self):
+        """Текущий курсор журнала: начать синхронизацию «с этого момента»"""
+        with self._connection() as conn:
+            row = conn.execute(self.__scripts["last_change_id"]).fetchone()
+            return row[0] or 0
+
     def get_by_email(self, user_email: str):
-        with self.__db.connect() as conn:
+        with self._read_connection() as conn:
             result = conn.execute(self.__scripts["select_by_email"],
                                   {"user_email": user_email})
             rows = result.fetchall()
-            return rows
+            return self._records(rows)
 
     def check_exists(self, user_id: int):
-        with self.__db.connect() as conn:
+        return self._cached(("exists", user_id),
+                            lambda: self._check_exists(user_id))
+
+    def _check_exists(self, user_id: int):
+        with self._connection() as conn:
             result = conn.execute(self.__scripts["check_exists"], {"user_id":
                                                                    user_id})
             exists_row = result.fetchone()
             return exists_row[0] if exists_row else False
 
-    def create_batch(self, users_data):
-        with self.__db.connect() as conn:
-            try:
-                rows_affected = 0
-                for user_id, user_email, subject_id in users_data:
-                    if not self.check_exists(user_id):
-                        result = conn.execute(self.__scripts["insert"], {
-                            "user_id": user_id,
-                            "user_email": user_email,
-                            "subject_id": subject_id
-                        })
-                        rows_affected += result.rowcount
-                conn.execute("COMMIT")
-                return rows_affected
-            except Exception as e:
-                conn.execute("ROLLBACK")
-                raise e
+    def create_batch(self, users_data, bulk: bool = False,
+                     chunk_size: int = 500):
+        """Пакетное создание пользователей, уже существующие пропускаются
+
+        При bulk=True строки отправляются многострочными INSERT по
+        chunk_size штук, конфликты по user_id разрешает сама база.
+        """
+        if bulk:
+            return self._create_batch_bulk(users_data, chunk_size)
+
+        rows_affected = 0
+        with self.transaction() as tx:
+            for user_id, user_email, subject_id in users_data:
+                if not self.check_exists(user_id):
+                    result = tx.connection.execute(self.__scripts["insert"], {
+                        "user_id": user_id,
+                        "user_email": user_email,
+                        "subject_id": subject_id
+                    })
+                    rows_affected += result.rowcount
+        self._invalidate()
+        return rows_affected
+
+    def _create_batch_bulk(self, users_data, chunk_size: int):
+        if chunk_size < 1:
+            raise ValueError("chunk_size должен быть положительным")
+
+        rows_affected = 0
+        with self._begin() as conn:
+            for chunk in chunked(users_data, chunk_size):
+                result = conn.execute(
+                    bulk_insert_script(len(chunk)),
+                    bulk_insert_params(chunk))
+                rows_affected += result.rowcount
+        self._invalidate()
+        return rows_affected
+
+    def update_many(self, users_data, chunk_size: int = 500):
+        """Обновление многих пользователей в одной транзакции
+
+        users_data - iterable кортежей (user_id, user_email, subject_id).
+        Возвращает список rowcount по пачкам. На PostgreSQL каждая пачка -
+        один UPDATE ... FROM (VALUES ...), на остальных СУБД - executemany.
+        Если user_id повторяется, применяется последняя строка.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size должен быть положительным")
+
+        postgres = self.__db.dialect.name == "postgresql"
+        batch_counts = []
+        written = []
+        with self._begin() as conn:
+            for chunk in chunked(users_data, chunk_size):
+                # Повторы user_id внутри пачки: UPDATE ... FROM выбрал бы
+                # произвольную строку, поэтому оставляем последнюю
+                chunk = list({user[0]: user for user in chunk}.values())
+                if postgres:
+                    result = conn.execute(bulk_update_script(len(chunk)),
+                                          bulk_insert_params(chunk))
+                else:
+                    result = conn.execute(self.__scripts["update"], [
+                        {"user_id": user_id, "user_email": user_email,
+                         "subject_id": subject_id}
+                        for user_id, user_email, subject_id in chunk
+                    ])
+                batch_counts.append(result.rowcount)
+                written.extend(user_id for user_id, _, _ in chunk)
+        # Сброс после COMMIT: иначе параллельный get успеет закэшировать
+        # старую строку между сбросом и фиксацией
+        for user_id in written:
+            self._invalidate(user_id)
+        return batch_counts
+
+    def delete_many(self, user_ids, chunk_size: int = 1000):
+        """Удаление пользователей по списку ID в одной транзакции
+
+        Возвращает список rowcount по пачкам. На PostgreSQL используется
+        = ANY(:user_ids), на остальных СУБД - IN с развёрнутым списком.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size должен быть положительным")
+
+        script = DELETE_MANY_SCRIPTS.get(self.__db.dialect.name,
+                                         DELETE_MANY_SCRIPTS["default"])
+        batch_counts = []
+        written = []
+        with self._begin() as conn:
+            for chunk in chunked(user_ids, chunk_size):
+                result = conn.execute(script, {"user_ids": chunk})
+                batch_counts.append(result.rowcount)
+                written.extend(chunk)
+        for user_id in written:
+            self._invalidate(user_id)
+        return batch_counts
 
     def get_user_as_dict(self, user_id: int):
         row = self.get(user_id)
@@ -181,41 +872,184 @@ class UserTable:
             for row in rows
         ]
 
-    def update_email(self, user_id: int, new_email: str):
-        user = self.get(user_id)
-        if not user:
-            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+    def iter_all_as_dicts(self, yield_per: int = 1000):
+        """Ленивая версия get_all_as_dicts"""
+        for row in self.iter_all(yield_per):
+            yield {
+                'user_id': row[0],
+                'user_email': row[1],
+                'subject_id': row[2]
+            }
 
-        current_subject_id = user[2]
-        return self.update(user_id, new_email, current_subject_id)
+    def get_all_columnar(self, output: str = "numpy",
+                         yield_per: int = 10000):
+        """Все пользователи в колоночном виде
+
+        output="numpy" - dict[str, numpy.ndarray] (user_id и subject_id -
+        int64, user_email - object), output="arrow" - pyarrow.RecordBatch.
+        Если среди subject_id есть NULL, для numpy это
+        numpy.ma.MaskedArray (NULL замаскированы), в Arrow - null.
+        Строки читаются порциями без промежуточных dict на каждую строку.
+        """
+        return self._columnar(self.__scripts["select_all"], {}, output,
+                              yield_per)
+
+    def search_users_columnar(self, email_pattern=None, min_subject_id=None,
+                              max_subject_id=None, output: str = "numpy",
+                              yield_per: int = 10000):
+        """Результат search_users в колоночном виде (см. get_all_columnar)"""
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id)
+        return self._columnar(search, params, output, yield_per)
+
+    def _columnar(self, script, params, output: str, yield_per: int):
+        if output not in ("numpy", "arrow"):
+            raise ValueError(f"Неизвестный формат вывода: {output!r}")
+
+        user_ids, user_emails, subject_ids = array("q"), [], array("q")
+        # subject_id допускает NULL: в subject_ids 0, в null_subjects 1
+        null_subjects = bytearray()
+        with self._read_connection() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                script, params)
+            for partition in result.partitions(yield_per):
+                ids, emails, subjects = zip(*partition)
+                user_ids.extend(ids)
+                user_emails.extend(emails)
+                if None in subjects:
+                    subject_ids.extend(0 if subject is None else subject
+                                       for subject in subjects)
+                    null_subjects.extend(subject is None
+                                         for subject in subjects)
+                else:
+                    subject_ids.extend(subjects)
+                    null_subjects.extend(bytes(len(subjects)))
+        has_nulls = 1 in null_subjects
+
+        if output == "arrow":
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError(
+                    "Для output='arrow' установите pyarrow: "
+                    "pip install pyarrow")
+            if has_nulls:
+                import numpy
+                subject_column = pyarrow.array(
+                    numpy.frombuffer(subject_ids, dtype=numpy.int64),
+                    pyarrow.int64(),
+                    mask=numpy.frombuffer(null_subjects, dtype=numpy.bool_))
+            else:
+                subject_column = _arrow_int64(subject_ids)
+            return pyarrow.record_batch(
+                [_arrow_int64(user_ids),
+                 pyarrow.array(user_emails, pyarrow.string()),
+                 subject_column],
+                names=["user_id", "user_email", "subject_id"])
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "Для колоночного экспорта установите numpy: "
+                "pip install numpy")
+        subject_column = numpy.frombuffer(subject_ids, dtype=numpy.int64)
+        if has_nulls:
+            subject_column = numpy.ma.MaskedArray(
+                subject_column,
+                mask=numpy.frombuffer(null_subjects, dtype=numpy.bool_))
+        return {
+            "user_id": numpy.frombuffer(user_ids, dtype=numpy.int64),
+            "user_email": numpy.array(user_emails, dtype=object),
+            "subject_id": subject_column,
+        }
+
+    def update_email(self, user_id: int, new_email: str):
+        return self._update_column(
+            "update_email", {"user_id": user_id, "user_email": new_email})
 
     def update_subject(self, user_id: int, new_subject_id: int):
-        user = self.get(user_id)
-        if not user:
-            raise ValueError(f"Пользователь с user_id={user_id} не найден")
+        return self._update_column(
+            "update_subject",
+            {"user_id": user_id, "subject_id": new_subject_id})
+
+    def _update_column(self, script_name: str, params: dict):
+        """Обновление одной колонки, не трогая остальные
+
+        Вторая колонка не читается и не записывается обратно: чтение
+        могло бы прийти с отстающей реплики или из кэша и откатить
+        чужое изменение.
+        """
+        error_message = f"Пользователь с user_id={params['user_id']} " \
+            "не найден"
+        if self.__single_statement:
+            return self._write_one(script_name, params, error_message)
+
+        if not self.check_exists(params["user_id"]):
+            raise ValueError(error_message)
 
-        current_email = user[1]
-        return self.update(user_id, current_email, new_subject_id)
+        with self._begin() as conn:
+            result = conn.execute(self.__scripts[script_name], params)
+        self._invalidate(params["user_id"])
+        return result.rowcount
 
     def search_users(self, email_pattern=None, min_subject_id=None,
                      max_subject_id=None):
-        base_query = "SELECT * FROM users WHERE 1=1"
-        params = {}
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id)
+
+        with self._read_connection() as conn:
+            result = conn.execute(search, params)
+            return self._records(result.fetchall())
+
+    def search_users_page(self, email_pattern=None, min_subject_id=None,
+                          max_subject_id=None, page_size: int = 50,
+                          page_token=None, backward: bool = False):
+        """Keyset-пагинация результатов поиска по user_id
+
+        Вместо OFFSET используется условие user_id > / < последнего
+        увиденного значения, поэтому стоимость страницы не зависит от
+        её номера.
+        """
+        if page_size < 1:
+            raise ValueError("page_size должен быть положительным")
+
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id,
+            paging=(page_token is not None, backward))
+        if page_token is not None:
+            params['page_cursor'] = _decode_page_token(page_token)
+        params['page_limit'] = page_size + 1
 
-        if email_pattern:
-            base_query += " AND user_email LIKE :email_pattern"
-            params['email_pattern'] = f"%{email_pattern}%"
+        with self._read_connection() as conn:
+            rows = self._records(conn.execute(search, params).fetchall())
 
-        if min_subject_id is not None:
-            base_query += " AND subject_id >= :min_subject_id"
-            params['min_subject_id'] = min_subject_id
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            rows.reverse()
+        if not rows:
+            return UserPage(rows)
 
-        if max_subject_id is not None:
-            base_query += " AND subject_id <= :max_subject_id"
-            params['max_subject_id'] = max_subject_id
+        first_token = _encode_page_token(rows[0][0])
+        last_token = _encode_page_token(rows[-1][0])
+        if backward:
+            return UserPage(rows, next_token=last_token,
+                            prev_token=first_token if has_more else None)
+        return UserPage(rows,
+                        next_token=last_token if has_more else None,
+                        prev_token=first_token if page_token else None)
 
-        search_script = text(base_query)
+    def get_page(self, page_size: int = 50, page_token=None,
+                 backward: bool = False):
+        """Страница всех пользователей, упорядоченных по user_id"""
+        return self.search_users_page(page_size=page_size,
+                                      page_token=page_token,
+                                      backward=backward)
 
-        with self.__db.connect() as conn:
-            result = conn.execute(search_script, params)
-            return result.fetchall()
+    def iter_search(self, email_pattern=None, min_subject_id=None,
+                    max_subject_id=None, yield_per: int = 1000):
+        """Ленивый поиск пользователей через серверный курсор"""
+        search, params = build_search(
+            email_pattern, min_subject_id, max_subject_id)
+        return self._stream(search, params, yield_per)
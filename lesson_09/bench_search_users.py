@@ -0,0 +1,75 @@
+"""Накладные расходы search_users: text() на каждый вызов против кэша
+
+Пример запуска:
+    python bench_search_users.py --calls 20000
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.sql import text
+
+from UserSchema import USERS_DDL
+from UsersTable import build_search
+
+FILTERS = [
+    {"email_pattern": "user1"},
+    {"min_subject_id": 3},
+    {"email_pattern": "user", "min_subject_id": 2, "max_subject_id": 8},
+    {},
+]
+
+
+def build_search_uncached(email_pattern=None, min_subject_id=None,
+                          max_subject_id=None):
+    """Прежняя реализация: конкатенация строк и новый text() на вызов"""
+    base_query = "SELECT * FROM users WHERE 1=1"
+    params = {}
+
+    if email_pattern:
+        base_query += " AND user_email LIKE :email_pattern"
+        params['email_pattern'] = f"%{email_pattern}%"
+
+    if min_subject_id is not None:
+        base_query += " AND subject_id >= :min_subject_id"
+        params['min_subject_id'] = min_subject_id
+
+    if max_subject_id is not None:
+        base_query += " AND subject_id <= :max_subject_id"
+        params['max_subject_id'] = max_subject_id
+
+    return text(base_query), params
+
+
+def per_call_us(builder, engine, calls: int, execute: bool):
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for i in range(calls):
+            script, params = builder(**FILTERS[i % len(FILTERS)])
+            if execute:
+                conn.execute(script, params).fetchall()
+        return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(USERS_DDL)
+        conn.exec_driver_sql(
+            "INSERT INTO users VALUES (1, 'user1@example.com', 5)")
+
+    for execute in (False, True):
+        title = "построение + выполнение" if execute else "построение"
+        before = per_call_us(build_search_uncached, engine, args.calls,
+                             execute)
+        after = per_call_us(build_search, engine, args.calls, execute)
+        print(f"{title}: было {before:.1f} мкс/вызов, "
+              f"стало {after:.1f} мкс/вызов ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
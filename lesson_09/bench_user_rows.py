@@ -0,0 +1,74 @@
+"""Память и скорость создания строк: Row SQLAlchemy, dict и User
+
+Пример запуска:
+    python bench_user_rows.py --rows 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+
+from UsersTable import User
+
+ROWS_SQL = """
+    WITH RECURSIVE ids(n) AS (
+        SELECT 1 UNION ALL SELECT n + 1 FROM ids WHERE n < {rows}
+    )
+    SELECT n, 'user' || n || '@example.com', n % 100 FROM ids
+"""
+
+
+def as_dict(row):
+    return {
+        'user_id': row[0],
+        'user_email': row[1],
+        'subject_id': row[2]
+    }
+
+
+def measure(build):
+    """(секунды, байт памяти) на построение списка строк"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, memory
+
+
+def fetch_rows(engine, rows: int):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(ROWS_SQL.format(rows=rows)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    # Во всех вариантах строки читаются из базы заново, поэтому в память
+    # входят и сами значения (строки email), а промежуточные Row
+    # освобождаются до замера
+    variants = {
+        "Row SQLAlchemy": lambda: fetch_rows(engine, args.rows),
+        "dict": lambda: [as_dict(row)
+                         for row in fetch_rows(engine, args.rows)],
+        "User": lambda: list(map(User._make,
+                                 fetch_rows(engine, args.rows))),
+    }
+    per_million = 1000000 / args.rows
+    print(f"Строк: {args.rows}")
+    for name, build in variants.items():
+        seconds, memory = measure(build)
+        print(f"{name:15} {memory * per_million / 2 ** 20:8.1f} МБ/1M строк"
+              f"  {args.rows / seconds:12.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()